@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the Keras (cnn / lstm / gru) and transformer pipelines of the project, as the notebook does.
+The code lives in the stockpred package (python -m stockpred --help for the individual steps).
+"""
+
+from stockpred.cli import run_keras, run_transformer
+
+if __name__ == '__main__':
+    scrips = ['AAPL', 'GOOGL', 'TSLA']
+    run_keras('BTC-USD', steps=200, scrips=scrips)   ## steps is a hyperparameter to be tuned
+    run_transformer('BTC-USD', start='2015-10-01', scrips=scrips)
@@ -0,0 +1,14 @@
+"""
+Stock price prediction with Keras (CNN / LSTM / GRU) and torch (transformer) models.
+
+    stockpred.data          price / feature stores, scaling, windowing and datasets
+    stockpred.indicators    technical indicators, batch and streaming
+    stockpred.keras_models  Keras models and their training
+    stockpred.transformer   transformer model and its Classifier
+    stockpred.forecast      evaluation, forecasting and plots
+    stockpred.serving       model export and the HTTP forecast server
+    stockpred.bench         benchmarks
+    stockpred.cli           command line, python -m stockpred
+
+Importing the package or its data / indicators modules does not import TensorFlow, torch or matplotlib.
+"""
@@ -0,0 +1,210 @@
+"""
+Walk-forward backtesting: the train / test boundary is rolled forward through the series, the model is
+refit on every fold and only ever predicts rows after the ones it was trained on.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from .data import price_store, process
+from .profiling import span
+
+
+def walk_forward_folds(n_rows, steps, initial, test_size, window=None):
+    '''
+    Splits the rows of a series into walk-forward folds. Like WindowDataset / WindowBatches, a row is
+    identified by its end: the window rows[end-steps:end] predicting rows[end].
+
+    INPUT: n_rows - length of the series
+           steps - length of a window
+           initial - rows of the first fold's training set
+           test_size - rows predicted by every fold, the boundary moves forward by as much
+           window - max training rows of a fold (rolling window), None keeps all the past rows (expanding)
+
+    OUTPUT: list of (train_ends, test_ends) arrays
+    '''
+    if initial <= steps:
+        raise ValueError(f'initial ({initial}) has to be larger than steps ({steps})')
+    if initial >= n_rows:
+        raise ValueError(f'initial ({initial}) leaves no row to test out of {n_rows}')
+    folds = []
+    for boundary in range(initial, n_rows, test_size):
+        first = steps if window is None else max(steps, boundary - window)
+        folds.append((np.arange(first, boundary), np.arange(boundary, min(boundary + test_size, n_rows))))
+    return folds
+
+
+class WalkForward(object):
+    '''
+    Walk-forward backtest of a Keras model (cnnmodel, lstmmodel, grumodel) or a transformer Classifier.
+    The inputs are cast to float32 once and every fold only selects its window ends, so no window is
+    recomputed or copied between folds. Every refit starts from the weights of the previous fold.
+
+    INPUT: x_data - array of shape (rows, features)
+           y_data - array of shape (rows, 1), row i is the target of the window x_data[i-steps:i]
+           steps - length of a window
+           initial, test_size, window - see walk_forward_folds
+           scaler - fitted scaler of y_data, the predictions are inverse transformed with it
+           index - labels of the rows (e.g. dates), defaults to their positions
+    '''
+
+    def __init__(self, x_data, y_data, steps, initial, test_size, window=None, scaler=None, index=None):
+        self.x = np.ascontiguousarray(x_data, dtype=np.float32).reshape(len(x_data), -1)
+        self.y = np.ascontiguousarray(y_data, dtype=np.float32).reshape(len(y_data), 1)
+        self.steps = steps
+        self.folds = walk_forward_folds(len(self.x), steps, initial, test_size, window)
+        self.scaler = scaler
+        self.index = np.arange(len(self.x)) if index is None else np.asarray(index)
+
+    @classmethod
+    def from_closes(cls, scrip, steps, initial, test_size, window=None, start='2015-10-01', store=None):
+        '''
+            Input: scrip - ticker whose closes are backtested, as the Keras models use them (see process)
+                   start - first date of the bars
+                   store - price store, defaults to price_store
+
+            Output: WalkForward over the scaled closes. The scaler is fit on the first training set only,
+                    so that no fold sees the range of the rows it predicts
+        '''
+        store = store if store is not None else price_store
+        closes = store.load(scrip, start)['Close']
+        values = closes.values.reshape(-1, 1)
+        scaler = process(values[:initial])[1]
+        scaled = scaler.transform(values)
+        return cls(scaled, scaled, steps, initial, test_size, window, scaler, closes.index)
+
+    @classmethod
+    def from_dataset(cls, dataset, time_period, initial, test_size, window=None):
+        '''
+            Input: dataset - GetDataset after get_dataset (scale=False as the transformer is trained,
+                             its scalers would be fit on the rows being predicted)
+                   time_period - window length of the transformer
+
+            Output: WalkForward over the features and targets of the dataset
+        '''
+        index = dataset.df.index[:dataset.get_size()]
+        return cls(dataset.x_data, dataset.y_data, time_period, initial, test_size, window, index=index)
+
+    def run(self, model, epochs=10, refit_epochs=2, refit_rows=None, batch_size=32, warm_start=True, params=None):
+        '''
+            Input: model - compiled or not Keras model, or a Classifier of a TransformerModel
+                   epochs - epochs of the first fold (and of every fold when warm_start is False)
+                   refit_epochs - epochs of the warm-started refits
+                   refit_rows - if given, refits only train on the last refit_rows rows of their training set
+                   batch_size - windows per batch
+                   warm_start - if False, every fold is trained from the initial weights and a fresh
+                                optimizer state for epochs
+                   params - parameters of the Classifier (transf_params), its n_epochs is overridden
+
+            Output: DataFrame with one row per fold: its boundaries, mse / mae of its predictions and the
+                    time spent refitting and predicting. The predictions are kept in self.predictions
+        '''
+        adapter = _ClassifierAdapter(model, params) if hasattr(model, 'train_batches') else _KerasAdapter(model)
+        initial_weights = adapter.get_weights()
+        rows, predictions = [], np.full((len(self.y), 1), np.nan, dtype=np.float32)
+        for fold, (train_ends, test_ends) in enumerate(self.folds):
+            refit = fold > 0 and warm_start
+            if refit and refit_rows is not None:
+                train_ends = train_ends[-refit_rows:]
+            if fold > 0 and not warm_start:
+                adapter.reset(initial_weights)
+
+            start = time.perf_counter()
+            with span('backtest.fit', rows=len(train_ends)):
+                adapter.fit(self.x, self.y, self.steps, train_ends, refit_epochs if refit else epochs, batch_size)
+            fit_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with span('backtest.predict', rows=len(test_ends)):
+                pred = adapter.predict(self.x, self.y, self.steps, test_ends, batch_size)
+            predict_s = time.perf_counter() - start
+
+            predictions[test_ends] = pred
+            error = pred - self.y[test_ends]
+            rows.append({
+                'fold': fold,
+                'train_start': self.index[train_ends[0]],
+                'train_end': self.index[train_ends[-1]],
+                'test_start': self.index[test_ends[0]],
+                'test_end': self.index[test_ends[-1]],
+                'train_rows': len(train_ends),
+                'epochs': refit_epochs if refit else epochs,
+                'mse': float(np.mean(np.square(error))),
+                'mae': float(np.mean(np.abs(error))),
+                'fit_s': fit_s,
+                'predict_s': predict_s,
+            })
+        self.predictions = predictions
+        return pd.DataFrame(rows).set_index('fold')
+
+    def results(self):
+        '''
+            Output: DataFrame of the actual and predicted values of every row predicted by a fold,
+                    inverse transformed when a scaler was given
+        '''
+        rows = np.concatenate([test_ends for _, test_ends in self.folds])
+        actual, predicted = self.y[rows].astype(np.float64), self.predictions[rows].astype(np.float64)
+        if self.scaler is not None:
+            actual, predicted = self.scaler.inverse_transform(actual), self.scaler.inverse_transform(predicted)
+        return pd.DataFrame({'Actual': actual[:, 0], 'Predictions': predicted[:, 0]}, index=self.index[rows])
+
+
+class _KerasAdapter(object):
+    def __init__(self, model):
+        self.model = model
+        if getattr(model, 'optimizer', None) is None:
+            model.compile(optimizer='adam', loss='mse')
+
+    def get_weights(self):
+        return self.model.get_weights()
+
+    def set_weights(self, weights):
+        self.model.set_weights(weights)
+
+    def reset(self, weights):
+        ## recompiling with a copy of the optimizer drops its state (Adam moments, iterations)
+        import tensorflow as tf
+        self.model.set_weights(weights)
+        optimizer = tf.keras.optimizers.deserialize(tf.keras.optimizers.serialize(self.model.optimizer))
+        self.model.compile(optimizer=optimizer, loss=self.model.loss)
+
+    def fit(self, x, y, steps, ends, epochs, batch_size):
+        from .keras_models import WindowBatches
+        self.model.fit(WindowBatches(x, steps, batch_size, targets=y, shuffle=True, ends=ends), epochs=epochs, verbose=0)
+
+    def predict(self, x, y, steps, ends, batch_size):
+        from .keras_models import WindowBatches
+        return self.model.predict(WindowBatches(x, steps, max(batch_size, 256), targets=y, ends=ends), verbose=0)
+
+
+class _ClassifierAdapter(object):
+    def __init__(self, clf, params):
+        from .transformer import transf_params
+        self.clf = clf
+        self.params = params if params is not None else transf_params
+
+    def get_weights(self):
+        return {name: value.clone() for name, value in self.clf.model.state_dict().items()}
+
+    def set_weights(self, weights):
+        self.clf.model.load_state_dict(weights)
+
+    def reset(self, weights):
+        ## train_batches makes a new optimizer on every call
+        self.set_weights(weights)
+
+    def fit(self, x, y, steps, ends, epochs, batch_size):
+        from .transformer import WindowDataset
+        params = type('params', (self.params,), {'n_epochs': epochs, 'batch_size': batch_size})
+        self.clf.train_batches(WindowDataset(x, y, steps, ends), params)
+
+    def predict(self, x, y, steps, ends, batch_size):
+        import torch
+        from .data import sliding_windows
+        windows = sliding_windows(x, steps)[ends - steps]   ## window ending at row end
+        self.clf.model.eval()
+        with torch.no_grad():
+            return np.concatenate([self.clf.model(torch.from_numpy(windows[i:i + 1024])).numpy()
+                                   for i in range(0, len(windows), 1024)])
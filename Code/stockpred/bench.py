@@ -0,0 +1,602 @@
+"""
+Reference (loop) implementations and benchmarks of the vectorized indicators and transforms, and the
+pipeline benchmark suite whose JSON results can be compared across revisions.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import importlib.util
+import tracemalloc
+import subprocess
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+from .data import PriceStore, GetDataset, get_stationary_data, synthetic_ohlcv, process, convert, peak_memory_mb
+from .indicators import indicator_params, get_indicators, williams_r, ulcer_index, money_flow_index, average_true_range
+
+"""# Benchmarks"""
+
+## per-row loop versions of the rolling indicators, kept as the reference for benchmark_indicators
+def williams_r_reference(df: pd.DataFrame, lookback: int):
+    wr = np.zeros(len(df))
+    for t_idx in range(len(df)):
+        if t_idx + 1 <= lookback:
+            wr[t_idx] = 0
+        else:
+            highest = np.max(df['High'].iloc[t_idx-lookback:t_idx].values)
+            lowest = np.min(df['Low'].iloc[t_idx-lookback:t_idx].values)
+            wr[t_idx] = (highest - df['Close'].iloc[t_idx]) / (highest - lowest)
+    df["williams_r"] = wr
+    return df
+
+def ulcer_index_reference(df: pd.DataFrame, lookback: int):
+    ui = np.zeros(len(df))
+    for t_idx in range(len(df)):
+        if t_idx + 1 <= lookback:
+            ui[t_idx] = 0
+        else:
+            maxprice = np.max(df['Close'].iloc[t_idx-lookback:t_idx].values)
+            percentage_drawdown = [(df['Close'].iloc[t_idx-i]-maxprice)/maxprice * 100 for i in reversed(range(lookback))]
+            ui[t_idx] = np.sqrt(np.sum(np.array(percentage_drawdown)**2) / lookback)
+    df['Ulcer_index'] = ui
+    return df
+
+def average_true_range_reference(df: pd.DataFrame, lookback: int):
+    av_tr_rang = np.zeros(len(df))
+    for t_idx in range(len(df)):
+        if t_idx + 1 <= lookback:
+            av_tr_rang[t_idx] = 0
+        else:
+            true_ranges = []
+            for idx in reversed(range(lookback)):
+                tr1 = df['High'].iloc[t_idx-idx] - df['Low'].iloc[t_idx-idx]
+                tr2 = np.abs(df['High'].iloc[t_idx-idx] - df['Close'].iloc[t_idx-idx])
+                tr3 = np.abs(df['Low'].iloc[t_idx-idx] - df['Close'].iloc[t_idx-idx])
+                true_ranges.append(np.max([tr1, tr2, tr3]))
+            av_tr_rang[t_idx] = sum(true_ranges) / lookback
+    df['ATR'] = av_tr_rang
+    return df
+
+def money_flow_index_reference(df: pd.DataFrame, period: int):
+    typical_price = (df['Close'] + df['High'] + df['Low']) / 3
+    money_flow = typical_price * df['Volume']
+    positive_flow, negative_flow = [], []
+    for i in range(1, len(typical_price)):
+        if typical_price.iloc[i] > typical_price.iloc[i-1]:
+            positive_flow.append(money_flow.iloc[i-1])
+            negative_flow.append(0)
+        elif typical_price.iloc[i] < typical_price.iloc[i-1]:
+            positive_flow.append(0)
+            negative_flow.append(money_flow.iloc[i-1])
+        else:
+            positive_flow.append(0)
+            negative_flow.append(0)
+
+    positive_mf = [sum(positive_flow[i + 1 - period:i + 1]) for i in range(period-1, len(positive_flow))]
+    negative_mf = [sum(negative_flow[i + 1 - period:i + 1]) for i in range(period - 1, len(negative_flow))]
+    idx = 0
+    mfi = np.zeros(len(df))
+    for t_idx in range(len(df)):
+        if t_idx + 1 <= period:
+            mfi[t_idx] = 0
+        else:
+            mfi[t_idx] = 100 * (positive_mf[idx] / (positive_mf[idx] + negative_mf[idx]))
+            idx += 1
+    df["MFI"] = mfi
+    return df
+
+def benchmark_indicators(sizes=(10_000, 100_000, 1_000_000), lookback=14, reference_rows=20_000):
+    '''
+    Times the vectorized rolling indicators against the per-row loops on synthetic bars. The loops are
+    linear in the number of rows, so they are only run on the first reference_rows rows and their time
+    is scaled up for the larger sizes; the outputs on those rows are also compared (MFI uses running sums
+    so it only agrees up to rounding, the others are identical).
+
+    INPUT: sizes - numbers of rows to benchmark
+           lookback - indicator lookback
+           reference_rows - max rows the loop versions are run on
+
+    OUTPUT: DataFrame with the timings and speedup per indicator and size
+    '''
+    indicators = [
+        ('williams_r', williams_r, williams_r_reference),
+        ('Ulcer_index', ulcer_index, ulcer_index_reference),
+        ('ATR', average_true_range, average_true_range_reference),
+        ('MFI', money_flow_index, money_flow_index_reference),
+    ]
+    results = []
+    for n_rows in sizes:
+        df = synthetic_ohlcv(n_rows)
+        ref_df = df.iloc[:min(n_rows, reference_rows)].copy()
+        for name, fast, reference in indicators:
+            start = time.perf_counter()
+            fast_out = fast(df.copy(), lookback)[name].values
+            fast_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            ref_out = reference(ref_df.copy(), lookback)[name].values
+            ref_time = (time.perf_counter() - start) * n_rows / len(ref_df)
+
+            results.append({
+                'indicator': name,
+                'rows': n_rows,
+                'vectorized_s': fast_time,
+                'loop_s': ref_time,
+                'loop_extrapolated': len(ref_df) < n_rows,
+                'speedup': ref_time / fast_time,
+                'identical': np.array_equal(fast_out[:len(ref_df)], ref_out, equal_nan=True),
+                'max_abs_diff': np.nanmax(np.abs(fast_out[:len(ref_df)] - ref_out)),
+            })
+            print(f"{name} ({n_rows} rows): vectorized {fast_time:.4f}s, loop {ref_time:.2f}s, speedup {ref_time / fast_time:.0f}x")
+    return pd.DataFrame(results)
+
+## per-column version of get_stationary_data as get_dataset used it, kept as the reference for benchmark_stationary
+def get_stationary_data_reference(df:pd.DataFrame, columns:list, diff:int):
+    for col in columns:
+        df_cp = df.copy()
+        df_cp[str(col)] = pd.DataFrame(np.log(df_cp[str(col)]).diff().diff(diff))
+        df = df_cp
+    return df
+
+def benchmark_stationary(n_rows=100_000, n_columns=20, diff=12):
+    '''
+    Measures the runtime and peak traced memory of the stationary transform of every column of a frame,
+    per column (as get_dataset used to) against the batched get_stationary_data in float64 and float32
+
+    INPUT: size of the synthetic frame and the diff of the transform
+    OUTPUT: DataFrame with the time (s) and peak memory (MB) of every variant
+    '''
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(np.exp(rng.normal(0, 1, (n_rows, n_columns))), columns=[f'col_{i}' for i in range(n_columns)])
+    variants = [
+        ('per_column', lambda: get_stationary_data_reference(df, df.columns, diff)),
+        ('batched', lambda: get_stationary_data(df, df.columns, diff)),
+        ('batched_float32', lambda: get_stationary_data(df, df.columns, diff, dtype=np.float32)),
+    ]
+    results = []
+    for name, run in variants:
+        tracemalloc.start()
+        start = time.perf_counter()
+        out = run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        results.append({'variant': name, 'time_s': elapsed, 'peak_mb': peak})
+        print(f"{name}: {elapsed:.3f}s, peak {peak:.1f} MB")
+        del out
+    return pd.DataFrame(results)
+
+def benchmark_imports(modules=('stockpred.indicators', 'stockpred.data', 'stockpred.forecast', 'stockpred.keras_models',
+                               'stockpred.transformer'), repeat=3):
+    '''
+    Times a cold import of every module in a fresh interpreter, along with the import of numpy and pandas
+    alone which all of them pay, and lists the heavy frameworks each import pulled in
+
+    INPUT: modules - modules to import
+           repeat - fresh interpreters per module, the fastest is kept
+
+    OUTPUT: DataFrame with the total import time (ms), the time over the numpy/pandas baseline (ms) and the
+            frameworks loaded per module
+    '''
+    script = ("import sys, time; start = time.perf_counter(); import {module}; "
+              "print(time.perf_counter() - start); "
+              "print(','.join(m for m in ('tensorflow', 'torch', 'matplotlib', 'sklearn', 'yfinance') if m in sys.modules))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def cold_import(module):
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c', script.format(module=module)], cwd=root,
+                                 capture_output=True, text=True, check=True).stdout.split('\n')
+            runs.append((float(out[0]), out[1]))
+        return min(runs)
+
+    baseline = cold_import('numpy, pandas')[0]
+    results = []
+    for module in modules:
+        elapsed, loaded = cold_import(module)
+        results.append({'module': module, 'import_ms': elapsed * 1000, 'over_baseline_ms': (elapsed - baseline) * 1000,
+                        'frameworks': loaded})
+        print(f"{module}: {elapsed * 1000:.0f} ms ({(elapsed - baseline) * 1000:.0f} ms over numpy/pandas) {loaded}")
+    return pd.DataFrame(results)
+
+"""# Pipeline benchmark suite"""
+
+class SyntheticSource(object):
+    '''
+    Price source of synthetic_ohlcv bars, as daily bars ending on end, for running the pipeline with no network
+
+    INPUT: number of bars of every scrip and the last date
+    '''
+
+    def __init__(self, n_rows, end='2024-12-31'):
+        self.n_rows = n_rows
+        self.end = end
+
+    def fetch(self, scrip, start, end=None):
+        data = synthetic_ohlcv(self.n_rows, seed=sum(map(ord, scrip)))
+        data.index = pd.date_range(end=self.end, periods=self.n_rows, freq='D', name='Date')
+        mask = data.index >= pd.Timestamp(start)
+        if end is not None:
+            mask &= data.index < pd.Timestamp(end)
+        return data[mask]
+
+def measure(run, repeat=3):
+    '''
+    Runs run() repeat times for its best wall and cpu time, then once more under tracemalloc for the peak
+    memory allocated by it (numpy and python allocations, torch tensors are not traced). Whatever run
+    prints is discarded.
+
+    OUTPUT: dict of wall_s, cpu_s and peak_mb
+    '''
+    wall, cpu = [], []
+    with redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start, start_cpu = time.perf_counter(), time.process_time()
+            run()
+            wall.append(time.perf_counter() - start)
+            cpu.append(time.process_time() - start_cpu)
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return {'wall_s': min(wall), 'cpu_s': min(cpu), 'peak_mb': peak}
+
+def _available(module):
+    return importlib.util.find_spec(module) is not None
+
+def pipeline_stages(n_rows, steps=50, time_period=30, train_windows=2048, forecast_scrips=8, params=None, stages=None):
+    '''
+    Builds the stages of the pipeline on n_rows synthetic bars
+
+    INPUT: n_rows - length of the series
+           steps - window of the Keras models (convert, forecast)
+           time_period - window of the transformer (split, train_epoch)
+           train_windows - max windows of the transformer epoch
+           forecast_scrips - scrips forecast together
+           params - transformer parameters, defaults to transf_params (one epoch is run)
+           stages - names of the stages wanted, all by default
+
+    OUTPUT: list of (stage, rows processed, function running it)
+    '''
+    df = synthetic_ohlcv(n_rows)
+    close = df['Close'].values
+    scaled = process(close)[0]
+
+    dataset = GetDataset(df)
+    with redirect_stdout(io.StringIO()):
+        dataset.get_dataset(scale=True)
+    pipeline = [
+        ('process', n_rows, lambda: process(close)),
+        ('convert', n_rows, lambda: convert(scaled, steps)),
+        ('get_indicators', n_rows, lambda: get_indicators(df.copy(), indicator_params)),
+        ('get_dataset', n_rows, lambda: GetDataset(df).get_dataset(scale=True)),
+        ('split', dataset.get_size(), lambda: dataset.split(0.8, time_period)),
+    ]
+
+    def wanted(stage):
+        return stages is None or stage in stages
+
+    if _available('torch') and wanted('train_epoch'):   ## framework stages are skipped where it is not installed
+        from .transformer import transf_params, TransformerModel, Classifier
+        params = type('params', (params or transf_params,), {'n_epochs': 1})
+        windows = dataset.get_window_dataset(1, time_period)
+        windows.ends = windows.ends[:train_windows]
+        clf = Classifier(TransformerModel(params))
+        pipeline.append(('train_epoch', len(windows), lambda: clf.train(windows, params)))
+
+    if _available('tensorflow') and wanted('forecast'):
+        from .keras_models import cnnmodel
+        from .forecast import forecast
+        store = PriceStore(root=os.path.join(tempfile.gettempdir(), 'stockpred_bench'), offline=True,
+                           fixtures=SyntheticSource(min(n_rows, 20_000)))   ## forecast only loads the bars since 2019
+        scrips = [f'SYN{i}' for i in range(forecast_scrips)]
+        model = cnnmodel(steps)
+        rows = sum(len(store.load(scrip, '2019-01-01')) for scrip in scrips)
+        pipeline.append(('forecast', rows, lambda: forecast([model], ['cnn'], scrips, steps, store=store)))
+    return [stage for stage in pipeline if wanted(stage[0])]
+
+def benchmark_pipeline(sizes=(1_000, 10_000, 100_000), repeat=3, output=None, stages=None, **kwargs):
+    '''
+    Times every stage of the pipeline (scaling, windowing, indicators, dataset preparation, split, a
+    transformer epoch and a forecast) on synthetic bars of every size, with no network access
+
+    INPUT: sizes - lengths of the synthetic series
+           repeat - runs per stage, the fastest is kept
+           output - path of the JSON results (see compare_benchmarks)
+           stages - names of the stages to run, all by default
+           kwargs - passed to pipeline_stages
+
+    OUTPUT: DataFrame of the wall / cpu time (s), rows per second and peak memory (MB) per stage and size
+    '''
+    results = []
+    for n_rows in sizes:
+        for stage, rows, run in pipeline_stages(n_rows, stages=stages, **kwargs):
+            result = {'stage': stage, 'size': n_rows, 'rows': rows, **measure(run, repeat)}
+            result['rows_per_s'] = rows / result['wall_s']
+            results.append(result)
+            print(f"{stage} ({n_rows} rows): {result['wall_s']:.4f}s, cpu {result['cpu_s']:.4f}s, "
+                  f"peak {result['peak_mb']:.1f} MB")
+
+    if output is not None:
+        try:
+            revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                      cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+        except OSError:
+            revision = None
+        meta = {
+            'revision': revision,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'repeat': repeat,
+            'peak_memory_mb': peak_memory_mb(),
+        }
+        with open(output, 'w') as file:
+            json.dump({'meta': meta, 'results': results}, file, indent=2)
+    return pd.DataFrame(results)
+
+def compare_benchmarks(base, new, threshold=0.1):
+    '''
+    Compares two benchmark_pipeline JSON results stage by stage
+
+    INPUT: base, new - paths of the results (new is compared against base)
+           threshold - relative change in wall time above which a stage is flagged
+
+    OUTPUT: DataFrame indexed by (stage, size) with the wall times, their ratio (new / base), the peak memory
+            of both and a flag of 'regression' / 'faster' / ''
+    '''
+    frames = []
+    for path in (base, new):
+        with open(path) as file:
+            frames.append(pd.DataFrame(json.load(file)['results']).set_index(['stage', 'size']))
+    table = frames[0][['wall_s', 'peak_mb']].join(frames[1][['wall_s', 'peak_mb']], how='inner',
+                                                    lsuffix='_base', rsuffix='_new')
+    table['ratio'] = table['wall_s_new'] / table['wall_s_base']
+    table['flag'] = np.where(table['ratio'] > 1 + threshold, 'regression',
+                             np.where(table['ratio'] < 1 / (1 + threshold), 'faster', ''))
+    return table
+
+"""# Reduced-precision inference"""
+
+def benchmark_precision(n_rows=3_000, steps=50, time_period=30, epochs=2, batch_sizes=(1, 32, 1024), repeat=5,
+                        models=('cnn', 'lstm', 'gru', 'transformer'), params=None):
+    '''
+    Trains the models briefly on synthetic bars, then reports the accuracy and CPU latency of their
+    reduced-precision variants on the held out last 20% of the windows (see precision.precision_report)
+
+    INPUT: n_rows - length of the synthetic series
+           steps - window of the Keras models, time_period of the transformer
+           epochs - training epochs of every model
+           batch_sizes, repeat - see precision_report
+           models - models benchmarked, those of a framework that is not installed are skipped
+           params - transformer parameters, defaults to transf_params
+
+    OUTPUT: DataFrame indexed by (model, variant)
+    '''
+    from .precision import precision_report
+    df = synthetic_ohlcv(n_rows)
+    boundary = int(n_rows * 0.8)
+    reports = []
+
+    keras_names = [name for name in models if name != 'transformer']
+    if keras_names and _available('tensorflow'):
+        from . import keras_models
+        from .keras_models import WindowBatches
+        scaled = process(df['Close'].values, dtype=np.float32)[0]
+        trained = dict()
+        for name in keras_names:
+            model = getattr(keras_models, f'{name}model')(steps)
+            model.compile(optimizer='adam', loss='mse')
+            model.fit(WindowBatches(scaled, steps, 32, shuffle=True, ends=np.arange(steps, boundary)),
+                      epochs=epochs, verbose=0)
+            trained[name] = model
+        windows, targets = convert(scaled, steps)
+        reports.append(precision_report(trained, windows[boundary - steps:], targets[boundary - steps:],
+                                        batch_sizes=batch_sizes, repeat=repeat))
+
+    if 'transformer' in models and _available('torch'):
+        from .transformer import transf_params, TransformerModel, Classifier
+        params = type('params', (params or transf_params,), {'n_epochs': epochs})
+        dataset = GetDataset(df)
+        with redirect_stdout(io.StringIO()):
+            dataset.get_dataset(scale=True, dtype=np.float32)
+            clf = Classifier(TransformerModel(params))
+            clf.train(dataset.get_window_dataset(0.8, time_period), params)
+        test = dataset.get_window_dataset(0.8, time_period, train=False)
+        windows, targets = test[np.arange(len(test))]
+        reports.append(precision_report({'transformer': clf.model}, windows.numpy(), targets.numpy(),
+                                        batch_sizes=batch_sizes, repeat=repeat))
+    return pd.concat(reports)
+
+"""# Static-shape transformer inference"""
+
+def benchmark_compiled(time_period=30, batch_sizes=(1, 32, 1024), repeat=20, modes=('eager', 'trace', 'compile'),
+                       params=None):
+    '''
+    Per-call latency of the transformer at every batch size: eager as Classifier.predict runs it (autograd on,
+    .detach().numpy()), eager under torch.inference_mode, and the CompiledTransformer of every other mode
+
+    INPUT: time_period - window length
+           batch_sizes - batch sizes timed
+           repeat - calls per batch size, the fastest is kept
+           modes - 'eager' and the CompiledTransformer modes ('trace', 'compile') to time
+           params - transformer parameters, defaults to transf_params
+
+    OUTPUT: DataFrame indexed by (mode, batch_size) of the setup time (s, tracing / compiling), the latency
+            (ms per call), the windows per second and the max difference to the eager predictions
+    '''
+    import torch
+    from .transformer import transf_params, TransformerModel, CompiledTransformer
+    params = params or transf_params
+    model = TransformerModel(params).eval()
+    windows = np.random.default_rng(0).standard_normal((max(batch_sizes), time_period, params.model_dim),
+                                                       dtype=np.float32)
+
+    def eager(batch):
+        return model(torch.from_numpy(batch)).detach().numpy()
+
+    def inference_mode(batch):
+        with torch.inference_mode():
+            return model(torch.from_numpy(batch)).numpy()
+
+    runners = []
+    if 'eager' in modes:
+        runners += [('eager', 0.0, eager), ('inference_mode', 0.0, inference_mode)]
+    for mode in modes:
+        if mode != 'eager':
+            compiled = CompiledTransformer(model, time_period, mode, batch_sizes)
+            out = np.empty((max(batch_sizes), compiled.output_dim), dtype=np.float32)
+            runners.append((mode, compiled.setup_s,
+                            lambda batch, compiled=compiled, out=out: compiled.predict(batch, out[:len(batch)])))
+
+    results = []
+    for mode, setup_s, run in runners:
+        for batch_size in batch_sizes:
+            batch = windows[:batch_size]
+            difference = float(np.max(np.abs(run(batch) - inference_mode(batch))))
+            result = {'mode': mode, 'batch_size': batch_size, 'setup_s': setup_s,
+                      'latency_ms': measure(lambda: run(batch), repeat)['wall_s'] * 1000, 'max_abs_diff': difference}
+            result['windows_per_s'] = batch_size / result['latency_ms'] * 1000
+            results.append(result)
+            print(f"{mode} batch {batch_size}: {result['latency_ms']:.3f} ms, {result['windows_per_s']:.0f} windows/s")
+    return pd.DataFrame(results).set_index(['mode', 'batch_size'])
+
+"""# Encoder layer costs"""
+
+def _saved_bytes(run, exclude=()):
+    '''
+        Output: result of run() and the bytes of the tensors autograd saved for the backward pass while it ran
+                (each storage counted once, the storages of exclude, e.g. the parameters, left out)
+    '''
+    import torch
+    excluded = {tensor.untyped_storage().data_ptr() for tensor in exclude}
+    saved = dict()
+
+    def pack(tensor):
+        storage = tensor.untyped_storage()
+        if storage.data_ptr() not in excluded:
+            saved[storage.data_ptr()] = storage.nbytes()
+        return tensor
+
+    with torch.enable_grad(), torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        result = run()
+    return result, sum(saved.values())
+
+def encoder_costs(model, windows, repeat=5):
+    '''
+    Cost of every layer of the encoder of a TransformerModel on a batch of windows
+
+    INPUT: model - TransformerModel (or anything holding an Encoder)
+           windows - array of shape (batch, time_period, model_dim)
+           repeat - forward passes timed per part, the fastest is kept
+
+    OUTPUT: DataFrame indexed by (layer, part), part being the attention or the feed_forward of the layer, of
+            its parameters (new_params counts shared ones only where they are first used, so that it sums
+            to the parameters of the encoder), the MFLOPs and the latency (ms) of its forward pass and the
+            activation memory (MB) autograd keeps for its backward pass, what checkpointing saves
+    '''
+    import torch
+    from torch.utils.flop_counter import FlopCounterMode, sdpa_flop_count
+    from .transformer import Encoder
+    custom_mapping = dict()
+    if hasattr(torch.ops.aten, '_scaled_dot_product_flash_attention_for_cpu'):   ## not counted by torch itself
+        custom_mapping[torch.ops.aten._scaled_dot_product_flash_attention_for_cpu] = \
+            lambda query, key, value, *args, out_shape=None, **kwargs: sdpa_flop_count(query, key, value)
+    encoder = next(module for module in model.modules() if isinstance(module, Encoder))
+    training = encoder.training
+    x = torch.as_tensor(windows, dtype=torch.float32)
+    out = x + encoder.positional_encoding(x.size(1), x.dtype, x.device)
+
+    rows, seen = [], set()
+    try:
+        for layer, (multihead_attention, feed_forward) in enumerate(encoder.blocks()):
+            for part, module, run in (('attention', multihead_attention, lambda X: multihead_attention(X, X, X)),
+                                      ('feed_forward', feed_forward, feed_forward)):
+                params = list(module.parameters())
+                encoder.train()   ## what autograd keeps while training
+                _, activation_bytes = _saved_bytes(lambda: run(out), params)
+                encoder.eval()
+                with torch.inference_mode():
+                    with FlopCounterMode(display=False, custom_mapping=custom_mapping) as counter:
+                        result = run(out)
+                    times = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        run(out)
+                        times.append(time.perf_counter() - start)
+                rows.append({'layer': layer, 'part': part,
+                             'params': sum(param.numel() for param in params),
+                             'new_params': 0 if id(module) in seen else sum(param.numel() for param in params),
+                             'mflops': counter.get_total_flops() / 1e6,
+                             'latency_ms': min(times) * 1000,
+                             'activation_mb': activation_bytes / 2**20})
+                seen.add(id(module))
+                out = result.clone()   ## out of inference mode for the next part
+    finally:
+        encoder.train(training)
+    return pd.DataFrame(rows).set_index(['layer', 'part'])
+
+def benchmark_encoder(time_period=256, batch_size=32, n_layers=None, repeat=3, params=None):
+    '''
+    Shared against independent encoder layers, with and without activation checkpointing, on long windows:
+    parameters, training step time and the activation memory autograd saves for the backward pass (see
+    _saved_bytes, the layer inputs a checkpoint keeps included). The per-layer costs (see encoder_costs)
+    of the independent layers are printed too.
+
+    INPUT: time_period - window length
+           batch_size - windows per training step
+           n_layers - encoder layers, defaults to those of params
+           repeat - training steps timed per configuration, the fastest is kept
+           params - transformer parameters, defaults to transf_params
+
+    OUTPUT: DataFrame indexed by (shared_layers, checkpoint)
+    '''
+    import torch
+    from .transformer import transf_params, TransformerModel
+    params = params or transf_params
+    n_layers = n_layers or params.n_layers
+    generator = np.random.default_rng(0)
+    x = torch.from_numpy(generator.standard_normal((batch_size, time_period, params.model_dim), dtype=np.float32))
+    y = torch.from_numpy(generator.standard_normal((batch_size, params.output_dim), dtype=np.float32))
+
+    results = []
+    for shared_layers in (True, False):
+        for checkpoint in (False, True):
+            config = type('params', (params,), {'n_layers': n_layers, 'shared_layers': shared_layers,
+                                                'checkpoint': checkpoint})
+            model = TransformerModel(config).train()
+            optimiser = torch.optim.Adam(model.parameters(), lr=config.lr)
+            ## with checkpoint what is saved is the input of every layer, kept for its recomputation
+            pred, saved = _saved_bytes(lambda: model(x), list(model.parameters()))
+            del pred
+
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                loss = torch.nn.functional.mse_loss(model(x), y)
+                optimiser.zero_grad()
+                loss.backward()
+                optimiser.step()
+                times.append(time.perf_counter() - start)
+            result = {'shared_layers': shared_layers, 'checkpoint': checkpoint,
+                      'params': sum(param.numel() for param in model.parameters()),
+                      'step_ms': min(times) * 1000, 'activation_mb': saved / 2**20}
+            results.append(result)
+            print(f"shared_layers={shared_layers} checkpoint={checkpoint}: {result['params']} parameters, "
+                  f"step {result['step_ms']:.1f} ms, activations {result['activation_mb']:.1f} MB")
+            if not shared_layers and not checkpoint:
+                with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_rows', None):
+                    print(encoder_costs(model, x[:min(batch_size, 8)].numpy(), repeat))
+    return pd.DataFrame(results).set_index(['shared_layers', 'checkpoint'])
@@ -0,0 +1,298 @@
+"""
+Command line entry points: python -m stockpred {keras, transformer, universe, backtest, sweep, serve, bench,
+compare} [options]
+
+The Keras and transformer subcommands run the same pipelines as main.py. Each subcommand only imports
+the framework it uses.
+"""
+
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from . import profiling
+from .data import price_store, feature_store, fetchdata, process, convert, inverse_stationary_data, GetDataset
+
+
+def run_keras(scrip='BTC-USD', steps=200, epochs=100, batchsize=32, scrips=('AAPL', 'GOOGL', 'TSLA'),
+              export='models', plot=True, tflite=(), features=feature_store, workers=None):
+    '''
+    Trains the cnn, lstm and gru models on the closes of scrip, then compares them and forecasts on scrips.
+    The exported models are also converted to TFLite in the tflite precisions (see export_models).
+    The scaled closes are cached in the FeatureStore features (None to always recompute them). The models
+    are trained and evaluated on WindowBatches, so the windows are only cut batch by batch. With workers,
+    the three models are trained at once in that many processes (see train_parallel) and their weights
+    loaded back.
+
+    OUTPUT: the trained models, their names and the forecasts
+    '''
+    from .keras_models import WindowBatches, cnnmodel, lstmmodel, grumodel, summary, train, train_parallel
+    from .forecast import comparemodels, forecast, plotresults, plotresultsforstocks, plotforecast
+
+    data = fetchdata(scrip)
+    data, scaler = process(data, store=features)
+
+    models = [cnnmodel(steps), lstmmodel(steps), grumodel(steps)]
+    modelnames = ['cnn', 'lstm', 'gru']
+    summary(models)
+    if workers:
+        intra_op = max(1, (os.cpu_count() or 1) // workers)
+        _, paths, _ = train_parallel([cnnmodel, lstmmodel, grumodel], modelnames, {scrip: data}, steps, epochs,
+                                     batchsize, workers, intra_op)
+        for model, name in zip(models, modelnames):
+            model.load_weights(paths[f"{scrip}_{name}"])
+    else:
+        train(models, WindowBatches(data, steps, batchsize, shuffle=True), None, epochs, batchsize)
+    if export:
+        from .serving import export_models
+        export_models(models, modelnames, steps, export, tflite)   ## for serve()
+
+    if plot:
+        plotresults(models, convert(data, steps, lazy=True, batch_size=1024), data[steps:], scaler, modelnames)
+    comparemodels(models, modelnames, scrips, steps)
+    if plot:
+        plotresultsforstocks(models, modelnames, scrips, steps)
+    preds = forecast(models, modelnames, scrips, steps)
+    if plot:
+        plotforecast(modelnames, scrips, preds)
+    return models, modelnames, preds
+
+
+def run_transformer(scrip='BTC-USD', start='2015-10-01', time_period=30, scrips=('AAPL', 'GOOGL', 'TSLA'),
+                    export='models', plot=True, features=feature_store):
+    '''
+    Trains a TransformerModel (with transf_params) on the unscaled features of scrip, then plots its
+    results on scrip and scrips. The features are cached in the FeatureStore features (None to always
+    recompute them)
+
+    OUTPUT: the trained Classifier
+    '''
+    from .transformer import transf_params, TransformerModel, Classifier
+    from .forecast import plotTransformerResults
+
+    df = price_store.load(scrip, start)
+    dataset = GetDataset(df, scrip)
+    dataset.get_dataset(scale=False, store=features)
+    dataset.split(train_split_ratio=1, time_period=time_period)
+    train_data, test_data = dataset.get_torchdata()
+    x_train, y_train = train_data
+
+    params = transf_params
+    model = TransformerModel(params)
+    clf = Classifier(model)
+    clf.train(dataset.get_window_dataset(train_split_ratio=1, time_period=time_period), params=params)
+    if export:
+        from .serving import export_transformer
+        export_transformer(model, params, export, time_period=time_period)
+
+    if plot:
+        import matplotlib.pyplot as plt
+        preds = pd.DataFrame(clf.predict([x_train, y_train], dataset.y_scaler, data_scaled=False))
+        preds.index = df.index[-len(x_train):]
+        preds['Actual'] = y_train
+        preds.rename(columns={0: 'Predictions'}, inplace=True)
+        preds = inverse_stationary_data(old_df=df, new_df=preds,
+                                        orig_feature='Actual', new_feature='Predictions',
+                                        diff=12, do_orig=True)
+        plt.plot(preds['Predictions'])
+        plt.plot(preds['Actual'])
+        plt.title(f"Training results for transformers({scrip})")
+        plt.show()
+        plotTransformerResults(clf, scrips, start)
+    return clf
+
+
+def run_universe(scrips=('BTC-USD', 'AAPL', 'GOOGL', 'TSLA'), start='2015-10-01', time_period=30, path='corpus',
+                 features=feature_store):
+    '''
+    Trains one TransformerModel on the windows of all the scrips, each scaled with its own scalers and
+    drawn in balanced batches (see Classifier.train_corpus)
+
+    OUTPUT: the trained Classifier and the MetricTable of its in-sample predictions of the next day close
+            of every scrip (the stationary transform inverted as in plotTransformerResults)
+    '''
+    import torch
+    from .data import WindowCorpus
+    from .evaluation import evaluate
+    from .transformer import transf_params, TransformerModel, Classifier
+
+    corpus = WindowCorpus.from_datasets(path, scrips, start, features=features, scale=True)
+    clf = Classifier(TransformerModel(transf_params))
+    clf.train_corpus(corpus, transf_params, time_period)
+
+    clf.model.eval()
+    actual, predicted = [], []
+    for scrip in corpus.names:
+        _, rows = corpus.window_index(time_period, [scrip])
+        x_batch, y_batch = corpus.dataset(time_period, [scrip])[np.arange(len(rows))]
+        with torch.no_grad():
+            pred = clf.model(x_batch).numpy()
+        actual.append(corpus.inverse_targets(scrip, y_batch.numpy(), rows)[:, 0])
+        predicted.append(corpus.inverse_targets(scrip, pred, rows)[None, :, 0])
+    return clf, evaluate(actual, predicted, corpus.names, ['transformer'])
+
+
+def run_backtest(scrip='BTC-USD', start='2015-10-01', model='cnn', steps=30, initial=1000, test_size=30,
+                 window=None, epochs=10, refit_epochs=2, refit_rows=None, features=feature_store):
+    '''
+    Walk-forward backtest of one of the Keras models on the closes of scrip, or of the transformer on its
+    unscaled features
+
+    OUTPUT: DataFrame of the folds (see WalkForward.run)
+    '''
+    from .backtest import WalkForward
+    if model == 'transformer':
+        from .transformer import transf_params, TransformerModel, Classifier
+        dataset = GetDataset(price_store.load(scrip, start), scrip)
+        dataset.get_dataset(scale=False, store=features)
+        backtest = WalkForward.from_dataset(dataset, steps, initial, test_size, window)
+        return backtest.run(Classifier(TransformerModel(transf_params)), epochs, refit_epochs, refit_rows,
+                            params=transf_params)
+    from . import keras_models
+    backtest = WalkForward.from_closes(scrip, steps, initial, test_size, window, start)
+    return backtest.run(getattr(keras_models, f'{model}model')(steps), epochs, refit_epochs, refit_rows)
+
+
+def run_bench(which, sizes=(1_000, 10_000, 100_000), repeat=3, output=None):
+    from . import bench
+    runs = {'indicators': bench.benchmark_indicators, 'stationary': bench.benchmark_stationary,
+            'imports': bench.benchmark_imports, 'precision': bench.benchmark_precision,
+            'compiled': bench.benchmark_compiled, 'encoder': bench.benchmark_encoder,
+            'pipeline': lambda: bench.benchmark_pipeline(sizes, repeat, output)}
+    for name in which or runs:
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(runs[name]())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='stockpred', description='Stock price prediction')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    keras = commands.add_parser('keras', help='train and compare the cnn / lstm / gru models')
+    keras.add_argument('--scrip', default='BTC-USD')
+    keras.add_argument('--steps', type=int, default=200)
+    keras.add_argument('--epochs', type=int, default=100)
+    keras.add_argument('--batch-size', type=int, default=32)
+    keras.add_argument('--tflite', nargs='+', default=[], choices=['float32', 'float16', 'int8'],
+                       help='also export the models to TFLite in these precisions')
+    keras.add_argument('--workers', type=int, help='train the three models at once in this many processes')
+
+    transformer = commands.add_parser('transformer', help='train the transformer model')
+    transformer.add_argument('--scrip', default='BTC-USD')
+    transformer.add_argument('--start', default='2015-10-01')
+    transformer.add_argument('--time-period', type=int, default=30)
+
+    for command in (keras, transformer):
+        command.add_argument('--scrips', nargs='+', default=['AAPL', 'GOOGL', 'TSLA'], help='scrips to evaluate on')
+        command.add_argument('--export', default='models', help="export directory for serve, '' to skip")
+        command.add_argument('--no-plot', action='store_true')
+        command.add_argument('--profile', help='JSON file for the timing of every pipeline stage')
+        command.add_argument('--trace', help='Chrome trace file of the pipeline stages')
+        command.add_argument('--trace-memory', action='store_true', help='also trace allocations (slower)')
+
+    server = commands.add_parser('serve', help='serve the exported models over HTTP')
+    server.add_argument('--path', default='models')
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=8000)
+    server.add_argument('--keras-precision', default='keras', choices=['keras', 'float32', 'float16', 'int8'],
+                        help='serve the Keras models or their TFLite export of this precision')
+    server.add_argument('--transformer-precision', default='float32', choices=['float32', 'bfloat16', 'int8'])
+    server.add_argument('--transformer-mode', default='eager', choices=['eager', 'trace', 'compile'],
+                        help='run the transformer eagerly or as a traced / compiled static-shape graph')
+
+    universe = commands.add_parser('universe', help='train one transformer on many scrips')
+    universe.add_argument('scrips', nargs='+')
+    universe.add_argument('--start', default='2015-10-01')
+    universe.add_argument('--time-period', type=int, default=30)
+    universe.add_argument('--path', default='corpus', help='directory of the window corpus')
+
+    backtest = commands.add_parser('backtest', help='walk-forward backtest of a model on one scrip')
+    backtest.add_argument('--scrip', default='BTC-USD')
+    backtest.add_argument('--start', default='2015-10-01')
+    backtest.add_argument('--model', default='cnn', choices=['cnn', 'lstm', 'gru', 'transformer'])
+    backtest.add_argument('--steps', type=int, default=30, help='window length')
+    backtest.add_argument('--initial', type=int, default=1000, help='rows of the first training set')
+    backtest.add_argument('--test-size', type=int, default=30, help='rows predicted per fold')
+    backtest.add_argument('--window', type=int, help='rolling training window, expanding by default')
+    backtest.add_argument('--epochs', type=int, default=10)
+    backtest.add_argument('--refit-epochs', type=int, default=2)
+    backtest.add_argument('--refit-rows', type=int, help='rows the warm-started refits train on')
+    backtest.add_argument('--output', help='csv file of the folds')
+
+    tuning = commands.add_parser('sweep', help='hyperparameter sweep with successive halving')
+    tuning.add_argument('space', help='JSON of the values of every parameter, e.g. \'{"steps": [50, 100, 200]}\'')
+    tuning.add_argument('--kind', default='keras', choices=['keras', 'transformer'])
+    tuning.add_argument('--scrip', default='BTC-USD')
+    tuning.add_argument('--start', default='2015-10-01')
+    tuning.add_argument('--path', default='sweep', help='directory of the trial log, resumed if it exists')
+    tuning.add_argument('--min-epochs', type=int, default=1)
+    tuning.add_argument('--max-epochs', type=int, default=9)
+    tuning.add_argument('--eta', type=int, default=3)
+    tuning.add_argument('--workers', type=int)
+
+    benchmarks = commands.add_parser('bench', help='run the benchmarks')
+    benchmarks.add_argument('which', nargs='*', choices=['indicators', 'stationary', 'imports', 'pipeline', 'precision',
+                                                         'compiled', 'encoder'])
+    benchmarks.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                            help='series lengths of the pipeline benchmark')
+    benchmarks.add_argument('--repeat', type=int, default=3)
+    benchmarks.add_argument('--output', help='JSON file for the pipeline results')
+
+    compare = commands.add_parser('compare', help='compare two pipeline benchmark results')
+    compare.add_argument('base')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=0.1, help='relative change flagged')
+
+    for command in (keras, transformer, universe, backtest, tuning):
+        command.add_argument('--no-feature-cache', action='store_true',
+                             help='recompute the preprocessed features instead of reusing them from feature_cache/')
+
+    args = parser.parse_args(argv)
+    features = None if getattr(args, 'no_feature_cache', False) else feature_store
+    if args.command in ('keras', 'transformer'):
+        profiler = None
+        if args.profile or args.trace:
+            profiler = profiling.enable(args.trace_memory)
+        try:
+            if args.command == 'keras':
+                run_keras(args.scrip, args.steps, args.epochs, args.batch_size, args.scrips, args.export,
+                          not args.no_plot, args.tflite, features, args.workers)
+            else:
+                run_transformer(args.scrip, args.start, args.time_period, args.scrips, args.export, not args.no_plot,
+                                features)
+        finally:
+            if profiler is not None:
+                profiling.disable()
+                print(profiler.report())
+                if args.profile:
+                    profiler.save_json(args.profile)
+                if args.trace:
+                    profiler.save_chrome_trace(args.trace)
+    elif args.command == 'universe':
+        print(run_universe(args.scrips, args.start, args.time_period, args.path, features)[1])
+    elif args.command == 'backtest':
+        folds = run_backtest(args.scrip, args.start, args.model, args.steps, args.initial, args.test_size, args.window,
+                             args.epochs, args.refit_epochs, args.refit_rows, features)
+        print(folds)
+        if args.output:
+            folds.to_csv(args.output)
+    elif args.command == 'sweep':
+        import json
+        from .sweep import sweep, sweep_data
+        x_data, y_data = sweep_data(args.scrip, args.kind, args.start, features=features)
+        trials = sweep(json.loads(args.space), x_data, y_data, args.path, args.kind, args.min_epochs, args.max_epochs,
+                       args.eta, workers=args.workers)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(trials)
+    elif args.command == 'serve':
+        from .serving import serve
+        serve(args.path, args.host, args.port, keras_precision=args.keras_precision,
+              transformer_precision=args.transformer_precision, transformer_mode=args.transformer_mode)
+    elif args.command == 'bench':
+        run_bench(args.which, args.sizes, args.repeat, args.output)
+    elif args.command == 'compare':
+        from .bench import compare_benchmarks
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(compare_benchmarks(args.base, args.new, args.threshold))
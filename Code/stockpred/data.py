@@ -0,0 +1,717 @@
+"""
+Price and feature stores, scaling, windowing, stationary transforms and the GetDataset pipeline.
+Only numpy and pandas are imported here; yfinance, scikit-learn, torch and TensorFlow are imported
+by the functions that use them.
+"""
+
+import os
+import sys
+import json
+import pickle
+import shutil
+import hashlib
+import time
+import resource
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .indicators import indicator_params, preprocess_data
+from .profiling import profiled
+
+"""# Price store"""
+
+class YahooSource(object):
+    '''
+    Downloads daily OHLCV bars from Yahoo Finance
+
+    INPUT: scrip, first date to fetch and (exclusive) last date, None meaning up to today
+    OUTPUT: DataFrame of bars indexed by Date
+    '''
+
+    @profiled('download', rows='output')
+    def fetch(self, scrip, start, end=None):
+        import yfinance as yf
+        data = yf.download(scrip, start=start, end=end, progress=False)
+        if isinstance(data.columns, pd.MultiIndex):   ## newer yfinance returns (Price, Ticker) columns
+            data.columns = data.columns.get_level_values(0)
+        return data
+
+class FixtureSource(object):
+    '''
+    Reads daily bars from local <root>/<scrip>.csv files (as written by DataFrame.to_csv), so that
+    everything can be run without network access
+
+    INPUT: directory holding the csv files
+    '''
+
+    def __init__(self, root):
+        self.root = root
+
+    def fetch(self, scrip, start, end=None):
+        path = os.path.join(self.root, f'{scrip}.csv')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'No fixture for {scrip} in {self.root}')
+        data = pd.read_csv(path, index_col=0, parse_dates=True)
+        data.index.name = 'Date'
+        mask = data.index >= pd.Timestamp(start)
+        if end is not None:
+            mask &= data.index < pd.Timestamp(end)
+        return data[mask]
+
+class PriceStore(object):
+    '''
+    On-disk cache of daily bars sitting between fetchdata and the data source. Every scrip is kept as a
+    directory of columnar .npy files (one per column plus the dates) and a small meta.json. Only the
+    bars from the last cached date on are fetched on refresh (that bar again, as it may have been cached
+    before the day closed), and a scrip is refreshed at most once every max_age seconds, so warm runs
+    read straight from disk (and from memory within the same run).
+
+    INPUT: root - directory of the cache
+           source - object with a fetch(scrip, start, end) method, defaults to YahooSource
+           offline - never touch the source, read from the cache or else from the fixtures
+           fixtures - source used on a cache miss in offline mode (e.g. FixtureSource)
+           max_age - seconds after which cached bars are refreshed
+    '''
+
+    def __init__(self, root='price_cache', source=None, offline=False, fixtures=None, max_age=12 * 3600):
+        self.root = root
+        self.source = source if source is not None else YahooSource()
+        self.offline = offline
+        self.fixtures = fixtures
+        self.max_age = max_age
+        self._frames = dict()   ## frames already loaded in this run
+
+    def load(self, scrip, start='2015-10-01'):
+        '''
+            Input: scrip - ticker to load
+                   start - first date needed
+
+            Output: DataFrame of the cached bars from start onwards, indexed by Date
+        '''
+        start = pd.Timestamp(start)
+        frame, meta = self._frames.get(scrip, (None, None))
+        if frame is None:
+            frame, meta = self._read(scrip)
+
+        if self.offline:
+            if frame is None or start < pd.Timestamp(meta['start']):
+                if self.fixtures is None:
+                    raise FileNotFoundError(f'{scrip} from {start.date()} is not cached and the store is offline')
+                frame = self._normalize(self.fixtures.fetch(scrip, start))
+                meta = {'start': str(start.date()), 'fetched_at': time.time()}
+        else:
+            changed = False
+            if frame is None:
+                frame = self._normalize(self.source.fetch(scrip, start))
+                meta = {'start': str(start.date()), 'fetched_at': time.time()}
+                changed = True
+            else:
+                if start < pd.Timestamp(meta['start']):   ## backfill the missing history
+                    older = self._normalize(self.source.fetch(scrip, start, end=meta['start']))
+                    frame = self._merge(older, frame)
+                    meta['start'] = str(start.date())
+                    changed = True
+                if time.time() - meta['fetched_at'] > self.max_age:   ## fetch only the new bars
+                    ## from the last cached one included, a partial intraday bar is replaced by _merge
+                    last = frame.index[-1] if len(frame) else start
+                    newer = self._normalize(self.source.fetch(scrip, last))
+                    frame = self._merge(frame, newer)
+                    meta['fetched_at'] = time.time()
+                    changed = True
+            if changed:
+                self._write(scrip, frame, meta)
+
+        self._frames[scrip] = (frame, meta)
+        return frame[frame.index >= start].copy()
+
+    def _normalize(self, data):
+        data = data.astype(np.float64)
+        index = pd.DatetimeIndex(data.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        data.index = index.rename('Date')
+        return data
+
+    def _merge(self, old, new):
+        if len(new) == 0:
+            return old
+        frame = pd.concat([old, new[old.columns]])
+        return frame[~frame.index.duplicated(keep='last')].sort_index()
+
+    def _read(self, scrip):
+        path = os.path.join(self.root, scrip)
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None, None
+        with open(meta_path) as file:
+            meta = json.load(file)
+        index = pd.DatetimeIndex(np.load(os.path.join(path, 'Date.npy')), name='Date')
+        columns = {col: np.load(os.path.join(path, f'{col}.npy')) for col in meta['columns']}
+        return pd.DataFrame(columns, index=index), meta
+
+    def _write(self, scrip, frame, meta):
+        path = os.path.join(self.root, scrip)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'Date.npy'), frame.index.values.astype('datetime64[ns]'))
+        for col in frame.columns:
+            np.save(os.path.join(path, f'{col}.npy'), frame[col].to_numpy(dtype=np.float64))
+        meta['columns'] = list(frame.columns)
+        with open(os.path.join(path, 'meta.json'), 'w') as file:   ## written last, marks the entry complete
+            json.dump(meta, file)
+
+price_store = PriceStore()   ## shared by every entry point, pass offline=True / fixtures to run without network
+
+## function to fetch the data as per the start date and column(open, close, volume etc)
+## returns the data as a numpy array
+## the bars come from the price store, so repeated calls for the same scrip don't download again
+@profiled(rows='output')
+def fetchdata(scrip, start = '2015-10-01', column = 'Close', store = None):
+  store = store if store is not None else price_store
+  data = store.load(scrip, start)
+  data = data.reset_index()[column]
+  print(data)
+  return np.array(data)
+
+"""# Feature store"""
+
+def hash_data(data):
+    '''
+    Content hash of an array or a DataFrame (values, index and column names)
+    '''
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(data, pd.DataFrame):
+        digest.update(json.dumps([str(col) for col in data.columns]).encode())
+        digest.update(_hashable(np.asarray(data.index)).view(np.uint8))
+        data = data.to_numpy()
+    data = _hashable(np.asarray(data))
+    digest.update(str(data.dtype).encode() + str(data.shape).encode())
+    digest.update(data.view(np.uint8))
+    return digest.hexdigest()
+
+def _hashable(values):
+    # object arrays (e.g. an index of strings or dates) have no fixed-size bytes, hash their string form
+    if values.dtype.hasobject:
+        values = values.astype(str)
+    return np.ascontiguousarray(values)
+
+class FeatureStore(object):
+    '''
+    Content-addressed on-disk cache of preprocessed datasets. An entry is a directory named after the hash
+    of everything its content depends on (scrip, data hash, parameters) holding one .npy file per array,
+    opened memory-mapped, and the pickled state (fitted scalers etc.). The least recently used entries are
+    evicted once the cache grows beyond max_bytes.
+
+    INPUT: root - directory of the cache
+           max_bytes - size bound of the cache
+           mmap - if the arrays are memory-mapped (read-only) instead of read into memory
+    '''
+
+    def __init__(self, root='feature_cache', max_bytes=2 * 2**30, mmap=True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+
+    @staticmethod
+    def key(*parts):
+        '''
+            Input: parts - anything the entry depends on, as json serializable values
+
+            Output: hex key of the entry
+        '''
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    def get(self, key):
+        '''
+            Output: (dict of arrays, state) of the entry, or None if it is not cached
+        '''
+        path = os.path.join(self.root, key)
+        state_path = os.path.join(path, 'state.pkl')
+        if not os.path.exists(state_path):
+            return None
+        os.utime(path)   ## marks the entry as recently used
+        with open(state_path, 'rb') as file:
+            names, state = pickle.load(file)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if self.mmap else None)
+                  for name in names}
+        return arrays, state
+
+    def put(self, key, arrays, state=None):
+        '''
+            Input: key - key of the entry
+                   arrays - dict of numpy arrays
+                   state - picklable object stored along (e.g. the fitted scalers)
+        '''
+        path = os.path.join(self.root, key)
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), np.asarray(array))
+        with open(os.path.join(tmp_path, 'state.pkl'), 'wb') as file:
+            pickle.dump((list(arrays), state), file)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self._evict(keep=key)
+
+    def _evict(self, keep):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path) or '.tmp' in name:
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            entries.append((os.stat(path).st_mtime, size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name != keep:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                total -= size
+
+feature_store = FeatureStore()   ## used by the cli entry points, so that re-running an experiment skips preprocessing
+
+"""# Utility functions"""
+
+## peak resident memory of the process in MB (and of the gpu when torch uses one)
+def peak_memory_mb():
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+  torch = sys.modules.get('torch')   ## only counted when something already imported torch
+  if torch is not None and torch.cuda.is_available():
+    peak += torch.cuda.max_memory_allocated() / 2**20
+  return peak
+
+## function to convert the data into range [0,1] as the values will vary over a large range and values ranges will be different for different stocks
+## with a FeatureStore given, the scaled data and its scaler are reused when the same data was processed before
+## dtype - if given (e.g. np.float32, what the models take) the data is scaled in that dtype instead of float64
+@profiled(rows='input')
+def process(data, store = None, dtype = None):
+  data = np.reshape(data, (data.shape[0],1))
+  if dtype is not None:
+    data = data.astype(dtype, copy = False)
+  if store is not None:
+    key = store.key('process', hash_data(data))
+    cached = store.get(key)
+    if cached is not None:
+      return cached[0]['df'], cached[1]
+  from sklearn.preprocessing import MinMaxScaler
+  scaler = MinMaxScaler(feature_range=(0,1))
+  df = scaler.fit_transform(data)
+  if store is not None:
+    store.put(key, {'df': df}, scaler)
+  return df, scaler   ## returning scaler as well because it will be usefull while converting the values back again
+
+## function to convert the scaled values into normal values for plotting
+def revconvert(data, scaler):
+  return scaler.inverse_transform(data)
+
+## converts the data into stepped data which will be useful while training various networks
+## the windows are a strided view of data (no copy), lazy = True returns a WindowBatches sequence instead
+@profiled(rows='input')
+def convert(data, steps, lazy = False, batch_size = 32):
+  if lazy:
+    from .keras_models import WindowBatches
+    return WindowBatches(data, steps, batch_size)
+  return sliding_windows(data, steps), data[steps:]
+
+"""# Windowing"""
+
+def sliding_windows(data, steps, stop=None):
+    '''
+    Builds the windows data[i-steps:i] for i in [steps, stop) as a read-only strided view of data,
+    so no window is copied
+
+    INPUT: data - array of shape (rows,) or (rows, features)
+           steps - length of a window
+           stop - end (exclusive) of the last window's target row, defaults to len(data)
+
+    OUTPUT: array of shape (stop - steps, steps) or (stop - steps, steps, features)
+    '''
+    stop = len(data) if stop is None else stop
+    if stop <= steps:
+        return np.empty((0, steps) + data.shape[1:], dtype=data.dtype)
+    windows = sliding_window_view(data[:stop - 1], steps, axis=0)
+    return np.moveaxis(windows, -1, 1) if data.ndim > 1 else windows
+
+"""# Stationary transforms"""
+
+@profiled(rows='input')
+def get_stationary_data(df:pd.DataFrame, columns:list, diff:int, dtype=None):
+    # Making the data stationary: log, first difference and then the difference with the value diff rows back,
+    # done for all the columns at once, the result is written over the log values to keep a single extra copy
+    # dtype - if given (e.g. np.float32) the transform is computed in and returns that dtype
+    columns = [str(col) for col in columns]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stationary = np.log(df[columns].to_numpy(dtype=dtype))
+        first_diff = stationary[1:] - stationary[:-1]
+        np.subtract(first_diff[diff:], first_diff[:len(first_diff) - diff], out=stationary[diff + 1:])
+    stationary[:diff + 1] = np.nan
+    del first_diff
+
+    if list(df.columns) == columns:
+        return pd.DataFrame(stationary, index=df.index, columns=df.columns, copy=False)
+    df_cp = df.copy() if dtype is None else df.astype(dtype)
+    df_cp[columns] = stationary
+    return df_cp
+
+def inverse_stationary_data(old_df:pd.DataFrame, new_df: pd.DataFrame, orig_feature: str,
+                            new_feature: str, diff: int, do_orig=True):
+    # Inverse the stationary data transformation, for the new (and orig) feature in one pass
+    features = [orig_feature, new_feature] if do_orig else [new_feature]
+    log_orig = np.log(old_df[orig_feature])
+    shifted = log_orig.shift(1).reindex(new_df.index).to_numpy()[:, None]
+    lagged = log_orig.diff().shift(diff).reindex(new_df.index).to_numpy()[:, None]
+    new_df[features] = np.exp(new_df[features].to_numpy(dtype=np.float64) + shifted + lagged)
+    return new_df
+
+def stationary_base(values, diff:int):
+    # Log level the stationary value of every row is added to by the inverse transform, the row's value
+    # being exp(stationary + base) as in inverse_stationary_data (nan for the first diff + 1 rows)
+    log_values = np.log(np.asarray(values, dtype=np.float64))
+    base = np.full(len(log_values), np.nan)
+    base[diff + 1:] = log_values[diff:-1] + log_values[1:len(log_values) - diff] - log_values[:len(log_values) - diff - 1]
+    return base
+
+"""# Datasets"""
+
+class GetDataset(object):
+    def __init__(self, df, scrip=None):
+        super(GetDataset, self).__init__()
+        self.scrip = scrip
+        self.df = df
+        self.df["Next_day_closing_price"] = df["Close"].shift(-1).dropna()
+        if self.df.columns[0] == 'Date':
+            self.df = self.df.set_index('Date')
+        self.df["Actual"] = self.df["Next_day_closing_price"]
+
+
+
+    @profiled(rows=lambda result, self, *args, **kwargs: self.get_size())
+    def get_dataset(self, scale=True, stationary=True, indicators=False, dtype=None, diff=12,
+                    params=indicator_params, store=None):
+        '''
+            Input: scale - if to scale the input data
+                   dtype - dtype of the stationary features (e.g. np.float32), float64 by default
+                   diff - lag of the second difference of the stationary transform
+                   params - indicator parameters
+                   store - FeatureStore, if given the features and fitted scalers are loaded from it
+                           when this data was already processed with the same settings
+        '''
+        if store is not None:
+            key = store.key('get_dataset', self.scrip, hash_data(self.df[["Close", "Open", "High", "Low", "Volume"]]),
+                            {name: getattr(params, name) for name in dir(params) if not name.startswith('_')},
+                            scale, stationary, str(np.dtype(dtype)) if dtype else None, diff)
+            cached = store.get(key)
+            if cached is not None:
+                arrays, (self.x_scaler, self.y_scaler) = cached
+                self.x_data_values, self.y_data_values = arrays['x_data_values'], arrays['y_data_values']
+                self.x_data = arrays.get('x_data', self.x_data_values)
+                self.y_data = arrays.get('y_data', self.y_data_values)
+                return
+
+        x_df = self.df[["Close", "Open", "High", "Low", "Volume"]].dropna()[:-1]
+        y_df = self.df["Next_day_closing_price"].dropna().fillna(0)
+
+        x_processed_df = preprocess_data(x_df, params).fillna(0)
+        if stationary:
+            x_processed_df = get_stationary_data(x_processed_df, x_processed_df.columns, diff, dtype=dtype)
+
+            y_df = get_stationary_data(self.df[["Next_day_closing_price"]], ["Next_day_closing_price"], diff,
+                                       dtype=dtype)['Next_day_closing_price']
+            y_df.replace([np.inf, -np.inf, np.nan], 0, inplace=True)
+        x_processed_df.replace([np.inf, -np.inf], 0, inplace=True)
+
+
+        self.x_data_values = x_processed_df.fillna(0).values[:-1]
+        self.y_data_values = y_df.values[:-1].reshape(-1, 1)
+
+        from sklearn.preprocessing import MinMaxScaler
+        self.x_scaler = MinMaxScaler(feature_range=(-1, 1))
+        self.y_scaler = MinMaxScaler(feature_range=(-1, 1))
+
+        if scale:
+            self.x_data = self.x_scaler.fit_transform(self.x_data_values)
+            self.y_data = self.y_scaler.fit_transform(self.y_data_values)
+        else:
+            self.x_data = self.x_data_values
+            self.y_data = self.y_data_values
+
+        if store is not None:
+            arrays = {'x_data_values': self.x_data_values, 'y_data_values': self.y_data_values}
+            if scale:
+                arrays.update({'x_data': self.x_data, 'y_data': self.y_data})
+            store.put(key, arrays, (self.x_scaler, self.y_scaler))
+
+
+    @classmethod
+    def from_corpus(cls, corpus, scrip):
+        '''
+            Input: corpus - WindowCorpus written from GetDataset features
+                   scrip - ticker to open
+
+            Output: GetDataset whose x_data / y_data are memory-mapped rows of the corpus, so that
+                    split and get_window_dataset draw their windows lazily from disk
+        '''
+        dataset = cls.__new__(cls)
+        dataset.scrip, dataset.df = scrip, None
+        dataset.x_data, dataset.y_data = corpus.series(scrip)
+        dataset.x_scaler, dataset.y_scaler = corpus.scalers[scrip]
+        return dataset
+
+
+    def get_size(self):
+        '''
+            Output: returns the length of the dataset
+        '''
+        return len(self.x_data)
+
+
+    @profiled(rows=lambda result, self, *args, **kwargs: self.get_size())
+    def split(self, train_split_ratio=0.8, time_period=30):
+        '''
+            Input: train_split_ratio - percentage of dataset to be used for
+                                       the training data (float)
+                   time_period - time span in days to be predicted (in)
+
+            Output: lists of the training and validation data (input values and target values)
+                    size of the training data
+        '''
+
+        train_data_size = int(np.ceil(self.get_size() * train_split_ratio))
+        x_train_data = self.x_data[:train_data_size]
+        y_train_data = self.y_data[:train_data_size]
+
+        # windows are strided views of x_data, nothing is copied here
+        self.x_train = sliding_windows(x_train_data, time_period)
+        self.y_train = y_train_data[time_period:]
+        print(f'Shape of train data: (x, y) = ({np.shape(self.x_train)}, {np.shape(self.y_train)})')
+
+        x_test_data = self.x_data[train_data_size - time_period:]
+        self.x_test = sliding_windows(x_test_data, time_period)
+        self.y_test = self.y_data[train_data_size:]
+        print(f'Shape of test data: (x, y) = ({np.shape(self.x_test)}, {np.shape(self.y_test)})')
+        return [self.x_train, self.y_train], [self.x_test, self.y_test], train_data_size
+
+
+    def get_torchdata(self):
+        import torch
+        self.x_train_tensor = torch.tensor(self.x_train, dtype=torch.float32)
+        self.x_test_tensor = torch.tensor(self.x_test, dtype=torch.float32)
+
+        self.y_train_tensor = torch.tensor(self.y_train, dtype=torch.float32)
+        self.y_test_tensor = torch.tensor(self.y_test, dtype=torch.float32)
+
+        return [self.x_train_tensor, self.y_train_tensor], [self.x_test_tensor, self.y_test_tensor]
+
+
+    def get_window_dataset(self, train_split_ratio=0.8, time_period=30, train=True):
+        '''
+            Input: train_split_ratio, time_period - as in split
+                   train - if the training or the test windows are returned (boolean)
+
+            Output: WindowDataset with the same windows and targets as split, built lazily
+        '''
+        train_data_size = int(np.ceil(self.get_size() * train_split_ratio))
+        if train:
+            ends = np.arange(time_period, train_data_size)
+        else:
+            ends = np.arange(max(train_data_size, time_period), self.get_size())
+        from .transformer import WindowDataset
+        return WindowDataset(self.x_data, self.y_data, time_period, ends)
+
+"""# Window corpus"""
+
+class WindowCorpus(object):
+    '''
+    On-disk dataset of many tickers for training with bounded memory. The inputs and targets of all the
+    tickers are concatenated into two float32 files (x.f32 of shape (rows, features), y.f32 of shape (rows, 1))
+    that are opened as np.memmap, with index.json giving the rows of every ticker and scalers.pkl their
+    fitted scalers. Windows never cross two tickers and are only read from disk when a batch needs them.
+    The tickers whose targets are stationary also have their stationary_base rows in base.f64, to invert
+    the transform (see inverse_targets).
+
+    INPUT: path - directory of the corpus (written by WindowCorpus.write)
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as file:
+            index = json.load(file)
+        rows, features = index['rows'], index['features']
+        self.tickers = {ticker: (offset, length) for ticker, offset, length in index['tickers']}
+        self.names = [ticker for ticker, _, _ in index['tickers']]
+        self.x = np.memmap(os.path.join(path, 'x.f32'), dtype=np.float32, mode='r', shape=(rows, features))
+        self.y = np.memmap(os.path.join(path, 'y.f32'), dtype=np.float32, mode='r', shape=(rows, 1))
+        with open(os.path.join(path, 'scalers.pkl'), 'rb') as file:
+            self.scalers = pickle.load(file)
+        self.stationary = set(index.get('stationary', []))
+        self.base = None
+        if self.stationary:
+            self.base = np.memmap(os.path.join(path, 'base.f64'), dtype=np.float64, mode='r', shape=(rows,))
+
+    @classmethod
+    def write(cls, path, series):
+        '''
+            Input: path - directory to write the corpus to
+                   series - iterable of (ticker, x, y, scalers) or (ticker, x, y, scalers, base), written
+                            one at a time so only one ticker has to be in memory. Row i of y is the target
+                            of row i of x, rows of y past the last row of x (GetDataset has one) are dropped.
+                            base is the stationary_base of stationary targets, row i for y[i]
+
+            Output: the opened WindowCorpus
+        '''
+        os.makedirs(path, exist_ok=True)
+        tickers, scalers, stationary, offset, features = [], dict(), [], 0, None
+        with open(os.path.join(path, 'x.f32'), 'wb') as x_file, open(os.path.join(path, 'y.f32'), 'wb') as y_file, \
+                open(os.path.join(path, 'base.f64'), 'wb') as base_file:
+            for ticker, x, y, scaler, *base in series:
+                x = np.asarray(x, dtype=np.float32).reshape(len(x), -1)
+                features = x.shape[1] if features is None else features
+                if x.shape[1] != features:
+                    raise ValueError(f'{ticker} has {x.shape[1]} features, expected {features}')
+                if len(y) < len(x):
+                    raise ValueError(f'{ticker} has {len(y)} targets for {len(x)} rows')
+                x.tofile(x_file)
+                np.asarray(y[:len(x)], dtype=np.float32).reshape(len(x), 1).tofile(y_file)
+                if base:
+                    if len(base[0]) < len(x):
+                        raise ValueError(f'{ticker} has {len(base[0])} base rows for {len(x)} rows')
+                    stationary.append(ticker)
+                    np.asarray(base[0][:len(x)], dtype=np.float64).tofile(base_file)
+                else:
+                    np.full(len(x), np.nan).tofile(base_file)
+                tickers.append((ticker, offset, len(x)))
+                scalers[ticker] = scaler
+                offset += len(x)
+        with open(os.path.join(path, 'scalers.pkl'), 'wb') as file:
+            pickle.dump(scalers, file)
+        with open(os.path.join(path, 'index.json'), 'w') as file:
+            json.dump({'rows': offset, 'features': features or 0, 'tickers': tickers, 'stationary': stationary}, file)
+        return cls(path)
+
+    @classmethod
+    def from_datasets(cls, path, scrips, start='2015-10-01', store=None, features=None, **kwargs):
+        '''
+            Input: scrips - tickers to put in the corpus
+                   start - first date of the bars
+                   store - price store, defaults to price_store
+                   features - FeatureStore the datasets are cached in (e.g. feature_store), if given
+                   kwargs - arguments of GetDataset.get_dataset
+
+            Output: WindowCorpus of the GetDataset features (x_data, y_data) of every scrip, with the
+                    stationary_base of their next day closes when the targets are stationary
+        '''
+        store = store if store is not None else price_store
+        def series():
+            for scrip in scrips:
+                dataset = GetDataset(store.load(scrip, start), scrip)
+                dataset.get_dataset(store=features, **kwargs)
+                scalers = (dataset.x_scaler, dataset.y_scaler)
+                if not kwargs.get('stationary', True):
+                    yield scrip, dataset.x_data, dataset.y_data, scalers
+                else:
+                    base = stationary_base(dataset.df['Actual'], kwargs.get('diff', 12))
+                    yield scrip, dataset.x_data, dataset.y_data, scalers, base
+        return cls.write(path, series())
+
+    @classmethod
+    def from_prices(cls, path, scrips, start='2015-10-01', store=None, column='Close'):
+        '''
+            Output: WindowCorpus of the scaled prices of every scrip (as process returns them) for the
+                    convert / Keras path, the series is both the input and the target
+        '''
+        store = store if store is not None else price_store
+        def series():
+            for scrip in scrips:
+                data, scaler = process(np.array(store.load(scrip, start)[column]))
+                yield scrip, data, data, scaler
+        return cls.write(path, series())
+
+    def series(self, ticker):
+        '''
+            Output: memory-mapped (x, y) rows of one ticker, e.g. for convert(x, steps)
+        '''
+        offset, length = self.tickers[ticker]
+        return self.x[offset:offset + length], self.y[offset:offset + length]
+
+    def window_index(self, time_period, tickers=None):
+        '''
+            Input: time_period - length of a window
+                   tickers - tickers whose windows are indexed, all by default
+
+            Output: (codes, offsets) of every window whose time_period rows lie within one ticker:
+                    the position of its ticker in tickers (or in self.names) and the row of its
+                    target within that ticker's series
+        '''
+        tickers = self.names if tickers is None else list(tickers)
+        lengths = np.array([max(self.tickers[ticker][1] - time_period, 0) for ticker in tickers], dtype=np.int64)
+        codes = np.repeat(np.arange(len(tickers), dtype=np.int32), lengths)
+        first = np.cumsum(lengths) - lengths
+        offsets = np.arange(lengths.sum(), dtype=np.int64) - np.repeat(first, lengths) + time_period
+        return codes, offsets
+
+    def ends(self, time_period, tickers=None):
+        '''
+            Output: global rows whose preceding window of time_period rows lies within one ticker
+        '''
+        tickers = self.names if tickers is None else list(tickers)
+        codes, offsets = self.window_index(time_period, tickers)
+        starts = np.array([self.tickers[ticker][0] for ticker in tickers], dtype=np.int64)
+        return starts[codes] + offsets if len(codes) else np.zeros(0, dtype=np.int64)
+
+    def inverse_targets(self, ticker, y, rows=None):
+        '''
+            Input: ticker - ticker the targets belong to
+                   y - targets (or predictions) of the ticker
+                   rows - rows of the ticker's series y belongs to (e.g. the offsets of window_index),
+                          needed to invert stationary targets
+
+            Output: y in its original units: its own target scaler is inverted, then the stationary
+                    transform for the tickers written with a base (e.g. the closes of from_datasets)
+        '''
+        scaler = self.scalers[ticker]
+        scaler = scaler[1] if isinstance(scaler, tuple) else scaler
+        y = scaler.inverse_transform(np.asarray(y, dtype=np.float64).reshape(-1, 1))
+        if ticker not in self.stationary:
+            return y
+        if rows is None:
+            raise ValueError(f'{ticker} has stationary targets, the rows of y are needed to invert them')
+        offset, _ = self.tickers[ticker]
+        return np.exp(y + self.base[offset + np.asarray(rows)].reshape(-1, 1))
+
+    def dataset(self, time_period, tickers=None):
+        '''
+            Output: WindowDataset over the windows of the tickers (all by default) for torch training
+        '''
+        from .transformer import WindowDataset
+        return WindowDataset(self.x, self.y, time_period, self.ends(time_period, tickers))
+
+    def batches(self, steps, batch_size=32, tickers=None, shuffle=False):
+        '''
+            Output: WindowBatches over the windows of the tickers for Keras fit/predict
+        '''
+        from .keras_models import WindowBatches
+        return WindowBatches(self.x, steps, batch_size, targets=self.y, shuffle=shuffle,
+                             ends=self.ends(steps, tickers))
+
+"""# Synthetic data"""
+
+def synthetic_ohlcv(n_rows, seed=0):
+    '''
+    Random-walk OHLCV bars for benchmarking without any network access
+
+    INPUT: number of rows and the random seed
+    OUTPUT: DataFrame with Open, High, Low, Close and Volume columns indexed by minute
+    '''
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, n_rows)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 1e-3, (2, n_rows))) * close
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) + spread[0],
+        'Low': np.minimum(open_, close) - spread[1],
+        'Close': close,
+        'Volume': rng.integers(1_000, 1_000_000, n_rows).astype(np.float64),
+    }, index=pd.date_range('2000-01-01', periods=n_rows, freq='min', name='Date'))
@@ -0,0 +1,138 @@
+"""
+Batched evaluation: the predictions of many models on many tickers are stacked into one array, inverse
+scaled in one operation and scored with every metric in a single vectorized pass.
+"""
+
+import numpy as np
+import pandas as pd
+
+METRICS = ('loss', 'mse', 'mae', 'mape', 'direction')
+
+
+class MetricTable(object):
+    '''
+    Metrics of every (ticker, model) pair, backed by one array of shape (tickers, models, metrics)
+
+    INPUT: values - the metrics array
+           tickers, models - labels of the first two axes
+           metrics - names of the last axis, defaults to METRICS:
+                     loss (sum of squared errors), mse, mae, mape (%) and direction (share of the
+                     days whose up / down move relative to the previous actual value was predicted right)
+    '''
+
+    def __init__(self, values, tickers, models, metrics=METRICS):
+        self.values = values
+        self.tickers = list(tickers)
+        self.models = list(models)
+        self.metrics = list(metrics)
+
+    def __getitem__(self, metric):
+        '''
+            Output: array of shape (tickers, models) of the metric
+        '''
+        return self.values[..., self.metrics.index(metric)]
+
+    def get(self, ticker, model, metric):
+        return self.values[self.tickers.index(ticker), self.models.index(model), self.metrics.index(metric)]
+
+    def mean(self):
+        '''
+            Output: DataFrame of the metrics of every model averaged over the tickers
+        '''
+        return pd.DataFrame(np.nanmean(self.values, axis=0), index=pd.Index(self.models, name='model'),
+                            columns=self.metrics)
+
+    def to_frame(self):
+        '''
+            Output: DataFrame indexed by (ticker, model) with one column per metric
+        '''
+        index = pd.MultiIndex.from_product([self.tickers, self.models], names=['ticker', 'model'])
+        return pd.DataFrame(self.values.reshape(-1, len(self.metrics)), index=index, columns=self.metrics)
+
+    def __repr__(self):
+        return repr(self.to_frame())
+
+
+def stack_series(series, length=None):
+    '''
+    Stacks arrays whose last axis is time and whose lengths differ, aligned on their last value
+    (the most recent date) and padded with NaN at the start
+
+    INPUT: series - list of arrays of shape (..., n_i)
+           length - length of the time axis, defaults to the longest n_i
+
+    OUTPUT: float64 array of shape (len(series), ..., length)
+    '''
+    length = max(np.shape(values)[-1] for values in series) if length is None else length
+    stacked = np.full((len(series),) + np.shape(series[0])[:-1] + (length,), np.nan)
+    for k, values in enumerate(series):
+        values = np.asarray(values, dtype=np.float64)[..., -length:]
+        stacked[k, ..., length - values.shape[-1]:] = values
+    return stacked
+
+def inverse_scale(values, scalers):
+    '''
+    Inverse transforms the values of every ticker with its fitted single feature scaler (e.g. from process),
+    as one broadcast operation when they are MinMaxScalers
+
+    INPUT: values - array of shape (tickers, ..., time)
+           scalers - fitted scaler of every ticker
+
+    OUTPUT: array of the same shape in the original units
+    '''
+    if all(hasattr(scaler, 'scale_') and hasattr(scaler, 'min_') for scaler in scalers):
+        shape = (len(scalers),) + (1,) * (values.ndim - 1)
+        scale = np.array([scaler.scale_[0] for scaler in scalers]).reshape(shape)
+        offset = np.array([scaler.min_[0] for scaler in scalers]).reshape(shape)
+        return (values - offset) / scale
+    return np.stack([scaler.inverse_transform(ticker.reshape(-1, 1)).reshape(ticker.shape)
+                     for scaler, ticker in zip(scalers, values)])
+
+def compute_metrics(actual, predicted):
+    '''
+    Computes every metric of METRICS at once, ignoring the NaN padding of stack_series
+
+    INPUT: actual - array of shape (tickers, time)
+           predicted - array of shape (tickers, models, time)
+
+    OUTPUT: array of shape (tickers, models, len(METRICS))
+    '''
+    actual = actual[:, None, :]
+    error = predicted - actual
+    valid = np.isfinite(error)
+    count = valid.sum(axis=-1)
+    error = np.where(valid, error, 0)
+    squared = np.square(error)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(valid & (actual != 0), np.abs(error / actual), 0)
+        previous = actual[..., :-1]
+        moves = valid[..., 1:] & np.isfinite(previous)
+        hits = (np.sign(predicted[..., 1:] - previous) == np.sign(actual[..., 1:] - previous)) & moves
+        n_moves = moves.sum(axis=-1)
+        return np.stack([
+            np.where(count > 0, squared.sum(axis=-1), np.nan),
+            squared.sum(axis=-1) / count,
+            np.abs(error).sum(axis=-1) / count,
+            100 * relative.sum(axis=-1) / (valid & (actual != 0)).sum(axis=-1),
+            hits.sum(axis=-1) / n_moves,
+        ], axis=-1)
+
+def evaluate(actual, predicted, tickers, models, scalers=None):
+    '''
+    Scores the predictions of every model on every ticker
+
+    INPUT: actual - list (one per ticker) of the actual values, arrays of shape (n_i,) or (n_i, 1)
+           predicted - list (one per ticker) of the predictions of every model, arrays of shape
+                       (models, n_i) or (models, n_i, 1)
+           tickers, models - their labels
+           scalers - if given, the fitted scaler of every ticker, actual and predicted are then scaled
+                     values and are inverse transformed (all at once) before scoring
+
+    OUTPUT: MetricTable
+    '''
+    actual = stack_series([np.reshape(values, -1) for values in actual])
+    predicted = stack_series([np.reshape(values, (len(models), -1)) for values in predicted], actual.shape[-1])
+    if scalers is not None:
+        both = inverse_scale(np.concatenate([actual[:, None], predicted], axis=1), scalers)
+        actual, predicted = both[:, 0], both[:, 1:]
+    return MetricTable(compute_metrics(actual, predicted), tickers, models)
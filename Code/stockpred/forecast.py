@@ -0,0 +1,165 @@
+"""
+Evaluation, forecasting and plotting of the trained models. TensorFlow and matplotlib are imported by
+the functions that need them.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from .data import price_store, fetchdata, process, convert, inverse_stationary_data, GetDataset
+from .profiling import profiled
+from .evaluation import evaluate
+
+"""# Functions to compare the results of models"""
+
+## the scrips are fetched and preprocessed in a thread pool, ahead of the one being evaluated
+## the predictions of all the models and scrips are inverse scaled and scored together (see evaluation.evaluate)
+## returns a MetricTable of the (ticker, model) metrics in prices
+def evaluate_models(models, modelnames, stockscrips, steps, workers = 4, prefetch = 8, batch_size = 1024, store = None):
+  scrips, scalers, actual, predicted = [], [], [], []
+  for stock, scaler, xtrain, ytrain in prepared_scrips(stockscrips, steps, workers, prefetch, store, batch_size):
+    scrips.append(stock)
+    scalers.append(scaler)
+    actual.append(ytrain[:, 0])
+    predicted.append(np.stack([model.predict(xtrain, verbose = 0)[:, 0] for model in models]))
+  return evaluate(actual, predicted, scrips, modelnames, scalers)
+
+## yields (scrip, scaler, xtrain, ytrain) in order, while up to prefetch further scrips are fetched,
+## scaled and windowed by the worker threads; xtrain is a WindowBatches of batch_size windows, cut when predicted
+def prepared_scrips(stockscrips, steps, workers = 4, prefetch = 8, store = None, batch_size = 1024):
+  store = store if store is not None else price_store
+  def prepare(stock):
+    data = np.array(store.load(stock)['Close'])
+    data, scaler = process(data)
+    return stock, scaler, convert(data, steps, lazy = True, batch_size = batch_size), data[steps:]
+
+  scrips = iter(stockscrips)
+  with ThreadPoolExecutor(max_workers = workers) as pool:
+    pending = deque(pool.submit(prepare, stock) for stock in islice(scrips, prefetch))
+    while pending:
+      result = pending.popleft().result()
+      for stock in islice(scrips, 1):
+        pending.append(pool.submit(prepare, stock))
+      yield result
+
+def comparemodels(models, modelnames, stockscrips, steps):
+  results = evaluate_models(models, modelnames, stockscrips, steps)
+  for stock in stockscrips:
+    print(f"****************** For {stock} ********************")
+    for name in modelnames:
+      print(f"Model {name} - MSE {results.get(stock, name, 'mse'):.4f}, MAE {results.get(stock, name, 'mae'):.4f}, "
+            f"MAPE {results.get(stock, name, 'mape'):.2f}%, direction {results.get(stock, name, 'direction'):.2%}")
+  return results
+
+## the forecast of every scrip is rolled out together, one compiled graph per model runs all the days
+@profiled(rows=lambda result, models, modelnames, scrips, *args, **kwargs: len(scrips))
+def forecast(models, modelnames, scrips, steps, days = 10, store = None):
+  histories, scalers = [], []
+  for scrip in scrips:
+    data = fetchdata(scrip, start = '2019-01-01', store = store)   ## most recent data suffices as we'd be using only last steps no of dates for prediction
+    data, scaler = process(data)
+    histories.append(data[-steps:])
+    scalers.append(scaler)
+  histories = np.stack(histories).astype(np.float32)   ## (scrips, steps, 1)
+
+  preds = {scrip: dict() for scrip in scrips}
+  for model, name in zip(models, modelnames):
+    rollout = forecast_rollout(model, histories, days)   ## (scrips, days, 1)
+    for k, scrip in enumerate(scrips):
+      preds[scrip][name] = scalers[k].inverse_transform(rollout[k].astype(np.float64))
+  return preds
+
+_rollout_fns = dict()
+
+## predicts days steps ahead for a batch of series, feeding every prediction back as the newest input
+## history is (series, steps, 1) and the output (series, days, 1); the whole loop runs inside one tf.function,
+## traced once per model and window length whatever the number of series and days
+## models with their own rollout (precision.TFLiteModel) run it instead
+def forecast_rollout(model, history, days):
+  if hasattr(model, 'rollout'):
+    return model.rollout(history, days)
+  import tensorflow as tf
+  key = (id(model), history.shape[1])
+  if key not in _rollout_fns:
+    @tf.function(input_signature=[tf.TensorSpec((None, history.shape[1], 1), tf.float32), tf.TensorSpec((), tf.int32)])
+    def rollout(window, days):
+      outputs = tf.TensorArray(window.dtype, size=days)
+      for i in tf.range(days):
+        pred = model(window, training=False)
+        window = tf.concat([window[:, 1:], pred[:, tf.newaxis, :]], axis=1)   ## rolling window
+        outputs = outputs.write(i, pred)
+      return tf.transpose(outputs.stack(), [1, 0, 2])
+    _rollout_fns[key] = (model, rollout)
+  rollout = _rollout_fns[key][1]
+  return rollout(tf.convert_to_tensor(history, dtype=tf.float32), tf.constant(days, dtype=tf.int32)).numpy()
+
+"""# Plotting"""
+
+def plotresultsforstocks(models, modelnames, stockscrips, steps):
+  import matplotlib.pyplot as plt
+  for stock, scaler, xtrain, ytrain in prepared_scrips(stockscrips, steps):
+    print(f"****************** For {stock} ********************")
+    i = 0
+    for model in models:
+      pred = model.predict(xtrain)
+      plt.plot(scaler.inverse_transform(ytrain))
+      plt.plot(scaler.inverse_transform(pred))
+      plt.title(f"Model {modelnames[i]}")
+      plt.show()
+      i += 1
+
+## xtrain can also be a WindowBatches sequence over the windows whose targets are ytrain
+def plotresults(models, xtrain, ytrain, scaler, modelnames):
+  import matplotlib.pyplot as plt
+  i = 0
+  for model in models:
+    pred = model.predict(xtrain)
+    plt.plot(scaler.inverse_transform(ytrain))
+    plt.plot(scaler.inverse_transform(pred))
+    plt.title(f"Model {modelnames[i]}")
+    plt.show()
+    i += 1
+
+def plotforecast(modelnames, scrips, preds):    ## should change this by taking inverse transform etc ##
+  import matplotlib.pyplot as plt
+  for scrip in scrips:
+    for model in modelnames:
+      plt.plot(preds[scrip][model], label = model)
+    plt.title(f"Forecast for {scrip}")
+    plt.show()
+
+def plotTransformerResults(clf, scrips, start='2015-10-01', store=None):
+    import matplotlib.pyplot as plt
+    store = store if store is not None else price_store
+    actual, predicted = [], []
+    for scrip in scrips:
+        df = store.load(scrip, start)
+        dataset = GetDataset(df)
+        dataset.get_dataset(scale=False)
+
+        train_data, test_data, train_data_len = dataset.split(train_split_ratio=1, time_period=30)
+
+        train_data, test_data = dataset.get_torchdata()
+        x_train, y_train = train_data
+
+        preds = clf.predict([x_train, y_train], dataset.y_scaler, data_scaled=False)
+        preds = pd.DataFrame({'Predictions': preds[:, 0], 'Actual': y_train[:, 0].numpy()}, index=df.index[-len(x_train):])
+        preds = inverse_stationary_data(old_df=df, new_df=preds,
+                                        orig_feature='Actual', new_feature='Predictions',
+                                        diff=12, do_orig=True)
+
+        actual.append(preds['Actual'].to_numpy())
+        predicted.append(preds['Predictions'].to_numpy()[None])
+        plt.plot(predicted[-1][0])
+        plt.plot(actual[-1])
+        plt.title(f"Results for stock {scrip} using Transformers")
+        plt.show()
+
+    results = evaluate(actual, predicted, scrips, ['transformer'])
+    for scrip in scrips:
+        print(f"Loss for {scrip} stock {results.get(scrip, 'transformer', 'mse')}")
+    return results
@@ -0,0 +1,296 @@
+"""
+Technical indicators over OHLCV frames, and their streaming counterparts for live bars.
+"""
+
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .profiling import profiled
+
+"""# Indicators"""
+
+def daily_return(df: pd.DataFrame):
+    df['Daily_returns'] = df['Close'].pct_change(1).fillna(0)
+    return df
+
+### MOMENTUM INDICATORS ###
+def roc_indicator(df: pd.DataFrame):
+    # Computes rate of change (RoC), i.e momentum - percent change
+    df["RoC"] = df['Close'].diff() / df['Close'][:-1]
+    return df
+
+def williams_r(df: pd.DataFrame, lookback: int):
+    # Computes Williams %R that measures overbought and oversold levels
+    # The high/low range is taken over the lookback rows before each row, rows without a full lookback are 0
+    high, low, close = df['High'].to_numpy(), df['Low'].to_numpy(), df['Close'].to_numpy()
+    wr = np.zeros(len(df))
+    if len(df) > lookback:
+        highest = sliding_window_view(high[:-1], lookback).max(axis=1)
+        lowest = sliding_window_view(low[:-1], lookback).min(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wr[lookback:] = (highest - close[lookback:]) / (highest - lowest)
+    df["williams_r"] = wr
+    return df
+
+### VOLUME INDICATORS ###
+def money_flow_index(df: pd.DataFrame, period: int):
+    # Measures buying and selling pressure (if below 20 then buy if above 80 then sell)
+    # The money flow of the previous row counts as positive (negative) when the typical price goes up (down),
+    # rolling sums of the flows are taken as differences of their running sums, which agree with the
+    # window by window sums up to rounding (~1e-10 on long high-volume series)
+    # A window with no flow at all (flat prices, no volume) is NaN as before, the pipeline fills it with 0
+    typical_price = ((df['Close'] + df['High'] + df['Low']) / 3).to_numpy()
+    money_flow = typical_price * df['Volume'].to_numpy()
+    change = np.diff(typical_price)
+    positive_flow = np.where(change > 0, money_flow[:-1], 0)
+    negative_flow = np.where(change < 0, money_flow[:-1], 0)
+
+    mfi = np.zeros(len(df))
+    if len(df) > period:
+        positive_mf = rolling_sum(positive_flow, period)
+        negative_mf = rolling_sum(negative_flow, period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mfi[period:] = 100 * (positive_mf / (positive_mf + negative_mf))
+    df["MFI"] = mfi
+    return df
+
+def rolling_sum(values, period):
+    # Sums of every period consecutive values computed from one cumulative sum, O(n) for any period
+    # NaNs only spoil the windows they fall into instead of the rest of the running sum
+    nans = np.isnan(values)
+    csum = np.concatenate([[0], np.cumsum(np.where(nans, 0, values))])
+    sums = csum[period:] - csum[:-period]
+    if nans.any():
+        nan_count = np.concatenate([[0], np.cumsum(nans)])
+        sums[(nan_count[period:] - nan_count[:-period]) > 0] = np.nan
+    return sums
+
+### VOLATILITY INDICATORS ###
+def ulcer_index(df: pd.DataFrame, lookback: int):
+    # Measures downside risk in terms of depth and duration of price declines
+    # Drawdowns of the last lookback closes (current one included) from the max of the lookback closes before it
+    close = df['Close'].to_numpy()
+    ui = np.zeros(len(df))
+    if len(df) > lookback:
+        maxprice = sliding_window_view(close[:-1], lookback).max(axis=1)[:, None]
+        percentage_drawdown = (sliding_window_view(close[1:], lookback) - maxprice) / maxprice * 100
+        ui[lookback:] = np.sqrt(np.sum(percentage_drawdown**2, axis=1) / lookback)
+    df['Ulcer_index'] = ui
+    return df
+
+def average_true_range(df: pd.DataFrame, lookback: int):
+    # Measures market volatility
+    high, low, close = df['High'].to_numpy(), df['Low'].to_numpy(), df['Close'].to_numpy()
+    true_range = np.maximum(np.maximum(high - low, np.abs(high - close)), np.abs(low - close))
+    av_tr_rang = np.zeros(len(df))
+    if len(df) > lookback:
+        true_ranges = sliding_window_view(true_range[1:], lookback)
+        # Summed column by column, oldest first, to keep the rounding of a left-to-right sum
+        atr = true_ranges[:, 0].copy()
+        for idx in range(1, lookback):
+            atr += true_ranges[:, idx]
+        av_tr_rang[lookback:] = atr / lookback
+    df['ATR'] = av_tr_rang
+    return df
+
+def simple_moving_average(df: pd.DataFrame, windows: list):
+    for window in windows:
+        df[f'SMA_{window}'] = df['Close'].rolling(window=window).mean().fillna(0)
+    return df
+
+def exponential_moving_average(df: pd.DataFrame, windows: list):
+    for window in windows:
+        df[f'EMA_{window}'] = df['Close'].ewm(span=window, adjust=False).mean().fillna(0)
+    return df
+
+class indicator_params:
+    williams_lookback = 14
+    mfi_period = 14
+    ulcer_lookback = 14
+    atr_lookback = 14
+    sma_windows = [5, 10, 20]
+    ema_windows = [20, 50]
+
+def get_indicators(df: pd.DataFrame, params=indicator_params):
+    df = daily_return(df)
+    df = roc_indicator(df)
+    df = williams_r(df, params.williams_lookback)
+    df = money_flow_index(df, params.mfi_period)
+    df = ulcer_index(df, params.ulcer_lookback)
+    df = average_true_range(df, params.atr_lookback)
+    df = simple_moving_average(df, params.sma_windows)
+    df = exponential_moving_average(df, params.ema_windows)
+    return df
+
+@profiled(rows='input')
+def preprocess_data(df, params=indicator_params):
+    if df.columns[0] == 'Date':
+        df = df.set_index('Date')
+
+    df = get_indicators(df, params)
+    return df
+
+"""# Streaming indicators"""
+
+class RollingWindow(object):
+    '''
+    Ring buffer over the last size values keeping their running sum and sum of squares. The sums are
+    recomputed from the buffer every time it wraps around so rounding errors can't pile up.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+
+    def push(self, value):
+        pos = self.count % self.size
+        old = self.values[pos]
+        self.values[pos] = value
+        self.count += 1
+        if pos == self.size - 1:
+            self.sum = sum(self.values)
+            self.sum_sq = sum(v * v for v in self.values)
+        else:
+            self.sum += value - old
+            self.sum_sq += value * value - old * old
+
+    def full(self):
+        return self.count >= self.size
+
+class MonotonicWindow(object):
+    '''
+    Max (or min) of the last size values, kept in a monotonic deque so that every push is amortized O(1)
+    '''
+
+    def __init__(self, size, maximum=True):
+        self.size = size
+        self.sign = 1 if maximum else -1
+        self.items = deque()   ## (index, signed value), signed values are decreasing
+        self.count = 0
+
+    def push(self, value):
+        signed = self.sign * value
+        while self.items and self.items[-1][1] <= signed:
+            self.items.pop()
+        self.items.append((self.count, signed))
+        self.count += 1
+        if self.items[0][0] <= self.count - 1 - self.size:
+            self.items.popleft()
+
+    def value(self):
+        return self.sign * self.items[0][1]
+
+def _divide(numerator, denominator):
+    # float division with numpy's results (inf / nan) instead of ZeroDivisionError
+    if denominator == 0:
+        return np.nan if numerator == 0 or numerator != numerator else np.copysign(np.inf, numerator) * np.copysign(1, denominator)
+    return numerator / denominator
+
+class StreamingIndicators(object):
+    '''
+    Incremental version of get_indicators for live bars. Once seeded with the history, every new bar updates
+    the state of each indicator in O(1) (amortized for the rolling max/min) and returns the feature vector of
+    that bar, in the order of the columns of preprocess_data on [Close, Open, High, Low, Volume].
+    The values agree with the batch computation up to rounding, except RoC which the batch computation
+    leaves empty (0) on the last row of the frame.
+
+    INPUT: indicator parameters (lookbacks and windows)
+    '''
+
+    def __init__(self, params=indicator_params):
+        self.params = params
+        self.columns = ["Close", "Open", "High", "Low", "Volume", "Daily_returns", "RoC", "williams_r", "MFI",
+                        "Ulcer_index", "ATR"] + [f'SMA_{window}' for window in params.sma_windows] + \
+                       [f'EMA_{window}' for window in params.ema_windows]
+        self.highs = MonotonicWindow(params.williams_lookback, maximum=True)
+        self.lows = MonotonicWindow(params.williams_lookback, maximum=False)
+        self.max_closes = MonotonicWindow(params.ulcer_lookback, maximum=True)
+        self.ulcer_closes = RollingWindow(params.ulcer_lookback)
+        self.true_ranges = RollingWindow(params.atr_lookback)
+        self.positive_flows = RollingWindow(params.mfi_period)
+        self.negative_flows = RollingWindow(params.mfi_period)
+        self.sma = [RollingWindow(window) for window in params.sma_windows]
+        self.ema = [None] * len(params.ema_windows)
+        self.count = 0   ## index of the next bar
+        self.prev_close = self.prev_typical_price = self.prev_money_flow = None
+
+    def seed(self, df):
+        '''
+            Input: df - history of bars with Open, High, Low, Close and Volume columns
+
+            Output: feature vector of the last bar of df
+        '''
+        p = self.params
+        keep = max([p.williams_lookback, p.mfi_period, p.ulcer_lookback, p.atr_lookback] +
+                   list(p.sma_windows) + list(p.ema_windows)) + 1
+        head, tail = df.iloc[:-keep], df.iloc[-keep:]
+        self.count = len(head)   ## only the tail goes through the windows, all of them fit in it
+        if len(head):
+            self.ema = [head['Close'].ewm(span=window, adjust=False).mean().iloc[-1] for window in p.ema_windows]
+        features = None
+        for o, h, l, c, v in tail[['Open', 'High', 'Low', 'Close', 'Volume']].itertuples(index=False):
+            features = self.update(o, h, l, c, v)
+        return features
+
+    def update(self, open_, high, low, close, volume):
+        '''
+            Input: Open, High, Low, Close and Volume of the new bar
+
+            Output: numpy array with the features of the bar (see self.columns)
+        '''
+        p = self.params
+        t = self.count
+
+        # williams_r and the ulcer max use the lookback bars before this one
+        williams = 0.0
+        if t >= p.williams_lookback and self.highs.items:
+            highest, lowest = self.highs.value(), self.lows.value()
+            williams = _divide(highest - close, highest - lowest)
+        self.highs.push(high)
+        self.lows.push(low)
+
+        ulcer = 0.0
+        self.ulcer_closes.push(close)
+        if t >= p.ulcer_lookback and self.max_closes.items:
+            maxprice, n = self.max_closes.value(), p.ulcer_lookback
+            # sum of (close - maxprice)^2 over the window from its running sums
+            squares = self.ulcer_closes.sum_sq - 2 * maxprice * self.ulcer_closes.sum + n * maxprice * maxprice
+            ulcer = np.sqrt(max(squares, 0.0) / n) * 100 / maxprice
+        self.max_closes.push(close)
+
+        self.true_ranges.push(max(high - low, abs(high - close), abs(low - close)))
+        atr = self.true_ranges.sum / p.atr_lookback if t >= p.atr_lookback else 0.0
+
+        # money flow of the previous bar, counted by the move of the typical price
+        typical_price = (close + high + low) / 3
+        if t >= 1 and self.prev_typical_price is not None:
+            up, down = typical_price > self.prev_typical_price, typical_price < self.prev_typical_price
+            self.positive_flows.push(self.prev_money_flow if up else 0.0)
+            self.negative_flows.push(self.prev_money_flow if down else 0.0)
+        mfi = 0.0
+        if t >= p.mfi_period:
+            mfi = 100 * _divide(self.positive_flows.sum, self.positive_flows.sum + self.negative_flows.sum)
+
+        daily_return, roc = 0.0, 0.0
+        if self.prev_close is not None:
+            daily_return = close / self.prev_close - 1
+            roc = (close - self.prev_close) / close
+
+        smas = []
+        for window, rolling in zip(p.sma_windows, self.sma):
+            rolling.push(close)
+            smas.append(rolling.sum / window if t >= window - 1 else 0.0)
+        for k, window in enumerate(p.ema_windows):
+            alpha = 2 / (window + 1)
+            self.ema[k] = close if self.ema[k] is None else (1 - alpha) * self.ema[k] + alpha * close
+
+        self.count += 1
+        self.prev_close, self.prev_typical_price, self.prev_money_flow = close, typical_price, typical_price * volume
+        return np.array([close, open_, high, low, volume, daily_return, roc, williams, mfi, ulcer, atr] +
+                        smas + self.ema)
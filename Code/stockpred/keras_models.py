@@ -0,0 +1,178 @@
+"""
+Keras CNN/LSTM/GRU forecasters with their batching, training and parallel training helpers.
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.layers import Flatten
+from tensorflow.keras.layers import Conv1D, Dense, LSTM, GRU
+from tensorflow.keras.layers import MaxPooling1D
+
+from .data import sliding_windows
+from .profiling import profiled
+
+"""# Batching"""
+
+class WindowBatches(tf.keras.utils.Sequence):
+    '''
+    Keras sequence over the windows of a series, to be passed to fit/predict in place of the full
+    (windows, steps, features) array which is then never materialized
+
+    INPUT: data - array of shape (rows, features)
+           steps - length of a window
+           batch_size - windows per batch
+           targets - array whose row i is the target of the window data[i-steps:i], defaults to data
+           shuffle - if the windows are reshuffled after every epoch (boolean)
+           ends - rows whose preceding window is used, defaults to every row from steps on
+    '''
+
+    def __init__(self, data, steps, batch_size=32, targets=None, shuffle=False, ends=None):
+        super().__init__()
+        self.windows = sliding_windows(data, steps)
+        self.targets = (data if targets is None else targets)[steps:]
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.indices = np.arange(len(self.windows)) if ends is None else np.asarray(ends) - steps
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(len(self.indices) / self.batch_size))
+
+    def __getitem__(self, idx):
+        batch = self.indices[idx * self.batch_size:(idx + 1) * self.batch_size]
+        return self.windows[batch].astype(np.float32), self.targets[batch].astype(np.float32)
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.indices)
+
+"""# Functions for plotting and summaries"""
+
+def summary(models):
+  for model in models:
+    model.summary()
+
+def pltmodel(models):
+  for model in models:
+    tf.keras.utils.plot_model(model,show_shapes=True,show_layer_names=False, to_file = f"{model}.png")
+
+"""# Functions to return models"""
+
+def cnnmodel(steps):
+    model = Sequential([
+      Conv1D(filters = 32, kernel_size=8, activation = 'relu', input_shape=(steps, 1)),
+      MaxPooling1D(pool_size=2),
+      Conv1D(filters = 16, kernel_size = 4, activation = 'relu'),
+      MaxPooling1D(pool_size=2),
+      Flatten(),
+      Dense(16, activation='relu'),
+      Dense(1),
+    ])
+    return model
+
+def lstmmodel(steps):
+  model=Sequential([
+    LSTM(int(steps/2),return_sequences=True,input_shape=(steps,1)),
+    LSTM(int(steps/6),return_sequences=True),
+    LSTM(int(steps/16),return_sequences=True),
+    LSTM(8),
+    Dense(1),
+  ])
+  return model
+
+def grumodel(steps):
+  model=Sequential([
+    GRU(int(steps/2),return_sequences=True,input_shape=(steps,1)),
+    GRU(int(steps/6),return_sequences=True),
+    GRU(int(steps/16),return_sequences=True),
+    GRU(8),
+    Dense(1),
+  ])
+  return model
+
+"""# Training the models"""
+
+## xtrain can also be a WindowBatches sequence (then ytrain is None and the batch size is the sequence's)
+@profiled(rows=lambda result, models, xtrain, *args, **kwargs: len(xtrain))
+def train(models, xtrain, ytrain, epochs = 100, batchsize = 32):
+  for model in models:
+    print(f"************ Training for model {model} *************")
+    model.compile(optimizer='adam', loss='mse')
+    if isinstance(xtrain, WindowBatches):
+      model.fit(xtrain, epochs = epochs)
+    else:
+      model.fit(xtrain, ytrain, epochs = epochs, batch_size = batchsize)
+
+## trains one model in a worker process, with its TensorFlow thread pools capped
+## the series are memory-mapped from the .npy files train_parallel saved, windows are cut batch by batch
+def train_job(builder, name, steps, x_path, y_path, epochs, batchsize, weights_dir, intra_op, inter_op):
+  tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+  tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+  x = np.load(x_path, mmap_mode = 'r')
+  y = np.load(y_path, mmap_mode = 'r')
+  model = builder(steps)
+  model.compile(optimizer='adam', loss='mse')
+  start = time.perf_counter()
+  history = model.fit(WindowBatches(x, steps, batchsize, targets = y, shuffle = True), epochs = epochs, verbose = 0)
+  elapsed = time.perf_counter() - start
+  path = os.path.join(weights_dir, f"{name}.weights.h5")
+  model.save_weights(path)
+  return name, history.history, path, elapsed
+
+## runs the jobs in a pool of worker processes, returns their histories, weight files and training times
+def run_jobs(jobs, workers, intra_op, inter_op, context):
+  histories, paths, times = dict(), dict(), dict()
+  with ProcessPoolExecutor(max_workers = workers, mp_context = multiprocessing.get_context(context)) as pool:
+    futures = [pool.submit(train_job, *job, intra_op, inter_op) for job in jobs]
+    for future in as_completed(futures):
+      name, history, path, elapsed = future.result()
+      histories[name], paths[name], times[name] = history, path, elapsed
+      print(f"************ Trained {name} in {elapsed:.1f}s *************")
+  return histories, paths, times
+
+## trains every (ticker, model) pair in a pool of worker processes instead of one after the other
+## builders are the model functions (cnnmodel, lstmmodel, ...), datasets maps a ticker to its scaled series
+## (e.g. from process, the windows of convert are cut from it) or to an (x, y) pair of series, row i of y
+## being the target of the window x[i-steps:i]. The series are saved once under weights_dir and memory-mapped
+## by the workers, so no window array is copied to them
+## every worker uses intra_op / inter_op threads, so workers * intra_op should match the cores
+## sequential = True first trains the same jobs one after the other in one process using all the cores,
+## for the speedup in the report
+## returns the histories and weight files by job name ("ticker_model") and a timing report, the weights
+## can be loaded back with model.load_weights(paths[name])
+def train_parallel(builders, modelnames, datasets, steps, epochs = 100, batchsize = 32, workers = None,
+                   intra_op = 1, inter_op = 1, weights_dir = 'weights', context = 'spawn', sequential = False):
+  data_dir = os.path.join(weights_dir, 'data')
+  os.makedirs(data_dir, exist_ok = True)
+  jobs = []
+  for ticker, series in datasets.items():
+    x, y = series if isinstance(series, tuple) else (series, series)
+    x_path, y_path = os.path.join(data_dir, f"{ticker}.x.npy"), os.path.join(data_dir, f"{ticker}.y.npy")
+    np.save(x_path, np.asarray(x, dtype = np.float32).reshape(len(x), -1))
+    np.save(y_path, np.asarray(y, dtype = np.float32).reshape(len(y), -1))
+    jobs += [(builder, f"{ticker}_{name}", steps, x_path, y_path, epochs, batchsize, weights_dir)
+             for builder, name in zip(builders, modelnames)]
+
+  report = {'sequential_s': None, 'speedup': None}
+  if sequential:
+    start = time.perf_counter()
+    run_jobs(jobs, 1, os.cpu_count() or 1, inter_op, context)
+    report['sequential_s'] = time.perf_counter() - start
+
+  workers = workers or max(1, (os.cpu_count() or 1) // intra_op)
+  start = time.perf_counter()
+  histories, paths, times = run_jobs(jobs, workers, intra_op, inter_op, context)
+  report.update({'wall_s': time.perf_counter() - start, 'workers': workers, 'job_s': times})
+  if sequential:
+    report['speedup'] = report['sequential_s'] / report['wall_s']
+    print(f"Wall clock {report['wall_s']:.1f}s vs {report['sequential_s']:.1f}s training one after the other "
+          f"({report['speedup']:.2f}x)")
+  else:
+    print(f"Wall clock {report['wall_s']:.1f}s with {workers} workers")
+  return histories, paths, report
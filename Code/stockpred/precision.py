@@ -0,0 +1,251 @@
+"""
+Opt-in reduced-precision CPU inference: bfloat16 autocast and dynamic int8 quantization of the linear
+layers of a TransformerModel, float16 / int8 TFLite conversions of the Keras models, and a report of the
+accuracy and latency of every variant against the float32 model. The trained models are left untouched.
+"""
+
+import io
+import os
+import copy
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+TRANSFORMER_PRECISIONS = ('float32', 'bfloat16', 'int8')
+TFLITE_PRECISIONS = ('float32', 'float16', 'int8')
+
+"""# Transformer"""
+
+class AutocastModel(object):
+    '''
+    Runs a torch model under CPU autocast: the matmuls of its linear layers and attention are computed in
+    bfloat16 (the weights are kept in float32) and the outputs are returned in float32
+
+    INPUT: the model and the autocast dtype, bfloat16 by default
+    '''
+
+    def __init__(self, model, dtype=None):
+        import torch
+        self.model = model
+        self.dtype = dtype or torch.bfloat16
+
+    def __call__(self, x):
+        import torch
+        with torch.autocast('cpu', dtype=self.dtype):
+            return self.model(x).float()
+
+    def eval(self):
+        self.model.eval()
+        return self
+
+def transformer_variant(model, precision='float32'):
+    '''
+        Input: model - trained TransformerModel
+               precision - 'float32' (the model itself), 'bfloat16' (AutocastModel) or 'int8' (a copy whose
+                           nn.Linear layers, the packed qkv projections of MultiHeadAttention included, are
+                           dynamically quantized: int8 weights, activations quantized batch by batch)
+
+        Output: model in eval mode, taking and returning float32 tensors
+
+    int8 uses torch.ao.quantization.quantize_dynamic, which torch deprecates in favour of torchao: its
+    deprecation warnings are silenced here, and a torch without it raises a RuntimeError.
+    '''
+    import torch
+    if precision == 'float32':
+        return model.eval()
+    if precision == 'bfloat16':
+        return AutocastModel(model).eval()
+    if precision == 'int8':
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', category=DeprecationWarning)
+            warnings.filterwarnings('ignore', message='.*quantized tensor creation functions.*are deprecated')
+            try:
+                from torch.ao.quantization import quantize_dynamic
+            except ImportError:
+                raise RuntimeError(f'int8 needs torch.ao.quantization.quantize_dynamic, which torch '
+                                   f'{torch.__version__} does not have, use float32 or bfloat16') from None
+            return quantize_dynamic(copy.deepcopy(model).eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    raise ValueError(f'Unknown precision {precision}, one of {TRANSFORMER_PRECISIONS}')
+
+"""# Keras models as TFLite"""
+
+def convert_tflite(model, precision='float16'):
+    '''
+    Converts a Keras model (cnnmodel, lstmmodel, grumodel) to TFLite. The LSTM / GRU layers are converted
+    unrolled (a clone with unroll=True and the same weights) as the builtin TFLite ops cannot run their
+    symbolic loop; the conversion then takes longer the longer the window.
+
+        Input: model - Keras model
+               precision - 'float32', 'float16' (float16 weights, computed in float32) or 'int8' (dynamic
+                           range: int8 weights, activations quantized on the fly)
+
+        Output: the TFLite flatbuffer (bytes)
+    '''
+    import tensorflow as tf
+    if precision not in TFLITE_PRECISIONS:
+        raise ValueError(f'Unknown precision {precision}, one of {TFLITE_PRECISIONS}')
+    config = model.get_config()
+    if any(layer['class_name'] in ('LSTM', 'GRU') for layer in config['layers']):
+        for layer in config['layers']:
+            if layer['class_name'] in ('LSTM', 'GRU'):
+                layer['config']['unroll'] = True
+        unrolled = tf.keras.Sequential.from_config(config)
+        unrolled.set_weights(model.get_weights())
+        model = unrolled
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if precision != 'float32':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+def export_tflite(model, name, path='models', precisions=('float16', 'int8')):
+    '''
+    Saves the TFLite conversions of a Keras model as {name}.{precision}.tflite in path
+
+        Output: list of the files written
+    '''
+    os.makedirs(path, exist_ok=True)
+    files = []
+    for precision in precisions:
+        files.append(os.path.join(path, f'{name}.{precision}.tflite'))
+        with open(files[-1], 'wb') as file:
+            file.write(convert_tflite(model, precision))
+    return files
+
+class TFLiteModel(object):
+    '''
+    Runs a TFLite conversion like the Keras model it comes from: called on a batch of windows of shape
+    (batch, steps, 1) it returns their predictions, predict and forecast_rollout accept it too. The input
+    is resized whenever the batch size changes. Not thread safe, like the interpreter.
+
+    INPUT: content - flatbuffer (convert_tflite) or path of a .tflite file
+           threads - interpreter threads, all the cores by default
+
+    The LiteRT interpreter (ai_edge_litert) is used when it is installed, tf.lite's otherwise.
+    '''
+
+    def __init__(self, content, threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        if isinstance(content, str):
+            with open(content, 'rb') as file:
+                content = file.read()
+        self.size_bytes = len(content)
+        self.interpreter = Interpreter(model_content=content, num_threads=threads)
+        self.input = self.interpreter.get_input_details()[0]['index']
+        self.output = self.interpreter.get_output_details()[0]['index']
+        self.steps = int(self.interpreter.get_input_details()[0]['shape'][1])
+        self.batch_size = None
+
+    def __call__(self, windows):
+        windows = np.ascontiguousarray(windows, dtype=np.float32)
+        if len(windows) != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input, windows.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = len(windows)
+        self.interpreter.set_tensor(self.input, windows)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output)
+
+    def predict(self, x, batch_size=1024, verbose=0):
+        return np.concatenate([self(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+
+    def rollout(self, history, days):
+        '''
+            Output: (series, days, 1) predictions fed back as the newest input, as forecast_rollout
+        '''
+        window = np.array(history, dtype=np.float32)
+        outputs = np.empty((len(window), days, 1), dtype=np.float32)
+        for i in range(days):
+            outputs[:, i] = self(window)
+            window[:, :-1] = window[:, 1:]
+            window[:, -1] = outputs[:, i]
+        return outputs
+
+"""# Accuracy against latency"""
+
+def _size_bytes(model):
+    if hasattr(model, 'size_bytes'):
+        return model.size_bytes
+    if hasattr(model, 'get_weights'):
+        return sum(weights.nbytes for weights in model.get_weights())
+    import torch
+    buffer = io.BytesIO()
+    torch.save(getattr(model, 'model', model).state_dict(), buffer)
+    return buffer.tell()
+
+def precision_variants(model, precisions=None):
+    '''
+        Input: model - Keras model or TransformerModel
+               precisions - variants wanted, all of TFLITE_PRECISIONS / TRANSFORMER_PRECISIONS by default
+
+        Output: {variant: (the variant's model, function of a float32 array of windows returning its
+                predictions)}, 'keras' (the model itself) or 'float32' first, the reference of the others
+    '''
+    if hasattr(model, 'get_weights'):
+        variants = {'keras': (model, model.predict_on_batch)}
+        for precision in precisions or TFLITE_PRECISIONS:
+            tflite = TFLiteModel(convert_tflite(model, precision))
+            variants[f'tflite_{precision}'] = (tflite, tflite)
+        return variants
+
+    import torch
+    variants = dict()
+    for precision in precisions or TRANSFORMER_PRECISIONS:
+        variant = transformer_variant(model, precision)
+
+        def run(windows, variant=variant):
+            with torch.inference_mode():
+                return variant(torch.from_numpy(windows)).numpy()
+        variants[precision] = (variant, run)
+    return variants
+
+def precision_report(models, windows, targets, precisions=None, batch_sizes=(1, 32, 1024), repeat=5):
+    '''
+    Accuracy and CPU latency of the reduced-precision variants of every model, to pick the cheapest one
+    whose error is acceptable
+
+    INPUT: models - {name: Keras model or TransformerModel}, all taking the same windows
+           windows - array of shape (windows, steps, features) the models are scored on
+           targets - array of shape (windows, 1)
+           precisions - variants wanted (see precision_variants)
+           batch_sizes - batch sizes the latency is measured at, the windows are repeated to fill a batch
+           repeat - calls per batch size, the fastest is kept
+
+    OUTPUT: DataFrame with one row per (model, variant): mse against the targets, max and mean absolute
+            difference to the predictions of the first (reference) variant, size of the weights (MB) and
+            the latency (ms per call) at every batch size
+    '''
+    windows = np.ascontiguousarray(windows, dtype=np.float32)
+    targets = np.asarray(targets, dtype=np.float32).reshape(len(targets), 1)
+    rows = []
+    for name, model in models.items():
+        reference = None
+        for variant, (runner, run) in precision_variants(model, precisions).items():
+            pred = np.concatenate([np.asarray(run(windows[i:i + 1024])).reshape(-1, 1)
+                                   for i in range(0, len(windows), 1024)])
+            reference = pred if reference is None else reference
+            row = {'model': name, 'variant': variant,
+                   'mse': float(np.mean(np.square(pred - targets))),
+                   'max_abs_diff': float(np.max(np.abs(pred - reference))),
+                   'mean_abs_diff': float(np.mean(np.abs(pred - reference))),
+                   'size_mb': _size_bytes(runner) / 2**20}
+            for batch_size in batch_sizes:
+                batch = np.ascontiguousarray(np.resize(windows, (batch_size,) + windows.shape[1:]))
+                run(batch)   ## warm up, and resize the TFLite input
+                times = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    run(batch)
+                    times.append(time.perf_counter() - start)
+                row[f'latency_ms_{batch_size}'] = min(times) * 1000
+            rows.append(row)
+            print(f"{name} {variant}: mse {row['mse']:.6f}, max diff {row['max_abs_diff']:.2e}, "
+                  + ', '.join(f"batch {b} {row[f'latency_ms_{b}']:.2f} ms" for b in batch_sizes))
+    return pd.DataFrame(rows).set_index(['model', 'variant'])
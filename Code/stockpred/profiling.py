@@ -0,0 +1,240 @@
+"""
+Timing spans around the stages of the pipeline (download, indicators, stationarity, windowing, scaling,
+training, predict). Spans are only recorded while a Profiler is enabled; otherwise span() and the
+profiled functions cost one check of a global.
+
+    with profile() as profiler:
+        run_keras(...)
+    profiler.save_json('profile.json')
+    profiler.save_chrome_trace('profile.trace.json')   ## chrome://tracing or ui.perfetto.dev
+"""
+
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+_profiler = None   ## the enabled Profiler, None when profiling is off
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_disabled = _NullSpan()   ## what span() returns while profiling is off
+
+
+class Span(object):
+    '''
+    One timed call: wall time, cpu time of the process, rows processed and, when memory is traced, the
+    bytes it left allocated and its peak allocation (cpu time and memory include the other threads)
+    '''
+
+    __slots__ = ('profiler', 'name', 'rows', 'start', 'cpu_start', 'wall_s', 'cpu_s', 'thread', 'depth',
+                 'memory_start', 'memory_peak', 'allocated_bytes', 'peak_bytes')
+
+    def __init__(self, profiler, name, rows=None):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.allocated_bytes = None
+        self.peak_bytes = None
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        self.depth = len(stack)
+        self.thread = threading.get_ident()
+        if self.profiler.trace_memory:
+            self.memory_start, peak = tracemalloc.get_traced_memory()
+            for span in stack:   ## parents keep the peak reached so far before it is reset for this span
+                span.memory_peak = max(span.memory_peak, peak)
+            self.memory_peak = self.memory_start
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.cpu_start = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self.start
+        self.cpu_s = time.process_time() - self.cpu_start
+        stack = self.profiler._stack()
+        if self.profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            for span in stack:
+                span.memory_peak = max(span.memory_peak, peak)
+            self.allocated_bytes = current - self.memory_start
+            self.peak_bytes = self.memory_peak - self.memory_start
+        stack.pop()
+        self.profiler._record(self)
+        return False
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'start_s': self.start - self.profiler.start,
+            'wall_s': self.wall_s,
+            'cpu_s': self.cpu_s,
+            'rows': self.rows,
+            'allocated_bytes': self.allocated_bytes,
+            'peak_bytes': self.peak_bytes,
+            'thread': self.thread,
+            'depth': self.depth,
+        }
+
+
+class Profiler(object):
+    '''
+    Collects the spans of a run
+
+    INPUT: trace_memory - also trace the allocations of every span with tracemalloc (slows python code down)
+    '''
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.started_tracing = False   ## set by enable when it started tracemalloc
+        self.spans = []
+        self.start = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def span(self, name, rows=None):
+        return Span(self, name, rows)
+
+    def summary(self):
+        '''
+            Output: {name: {calls, wall_s, cpu_s, rows, rows_per_s, allocated_bytes, peak_bytes}} summed over
+                    the calls (peak_bytes is the max), in the order the names were first seen
+        '''
+        totals = dict()
+        for span in sorted(self.spans, key=lambda span: span.start):
+            total = totals.setdefault(span.name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0,
+                                                  'allocated_bytes': None, 'peak_bytes': None})
+            total['calls'] += 1
+            total['wall_s'] += span.wall_s
+            total['cpu_s'] += span.cpu_s
+            total['rows'] += span.rows or 0
+            if span.allocated_bytes is not None:
+                total['allocated_bytes'] = (total['allocated_bytes'] or 0) + span.allocated_bytes
+                total['peak_bytes'] = max(total['peak_bytes'] or 0, span.peak_bytes)
+        for total in totals.values():
+            total['rows_per_s'] = total['rows'] / total['wall_s'] if total['rows'] and total['wall_s'] else None
+        return totals
+
+    def report(self):
+        '''
+            Output: summary() as a printable table
+        '''
+        lines = [f"{'span':<24}{'calls':>7}{'wall s':>10}{'cpu s':>10}{'rows':>12}{'alloc MB':>10}{'peak MB':>10}"]
+        for name, total in self.summary().items():
+            alloc = '' if total['allocated_bytes'] is None else f"{total['allocated_bytes'] / 2**20:.1f}"
+            peak = '' if total['peak_bytes'] is None else f"{total['peak_bytes'] / 2**20:.1f}"
+            lines.append(f"{name:<24}{total['calls']:>7}{total['wall_s']:>10.3f}{total['cpu_s']:>10.3f}"
+                         f"{total['rows']:>12}{alloc:>10}{peak:>10}")
+        return '\n'.join(lines)
+
+    def save_json(self, path):
+        '''
+            Writes the summary and every span to path
+        '''
+        with open(path, 'w') as file:
+            json.dump({'summary': self.summary(), 'spans': [span.as_dict() for span in self.spans]}, file, indent=2)
+
+    def save_chrome_trace(self, path):
+        '''
+            Writes the spans in the Chrome trace event format (chrome://tracing, ui.perfetto.dev)
+        '''
+        events = []
+        for span in self.spans:
+            args = {key: value for key, value in span.as_dict().items()
+                    if key in ('rows', 'cpu_s', 'allocated_bytes', 'peak_bytes') and value is not None}
+            events.append({'name': span.name, 'ph': 'X', 'pid': os.getpid(), 'tid': span.thread,
+                           'ts': (span.start - self.start) * 1e6, 'dur': span.wall_s * 1e6, 'args': args})
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+
+def enable(trace_memory=False):
+    '''
+        Output: a new Profiler recording every span from now on
+    '''
+    global _profiler
+    started = trace_memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _profiler = Profiler(trace_memory)
+    _profiler.started_tracing = started   ## disable only stops the tracing it started
+    return _profiler
+
+def disable():
+    '''
+        Output: the Profiler that was recording, if any
+    '''
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None and profiler.started_tracing:
+        tracemalloc.stop()
+    return profiler
+
+@contextmanager
+def profile(trace_memory=False):
+    profiler = enable(trace_memory)
+    try:
+        yield profiler
+    finally:
+        disable()
+
+def span(name, rows=None):
+    '''
+    Context manager timing its block as the span name while profiling is on; the rows can also be set
+    afterwards on the span it returns
+
+        with span('windowing', rows=len(data)):
+            ...
+    '''
+    if _profiler is None:
+        return _disabled
+    return _profiler.span(name, rows)
+
+def profiled(name=None, rows=None):
+    '''
+    Decorator timing every call of the function as a span
+
+    INPUT: name - span name, defaults to the function's qualified name
+           rows - rows processed by a call: 'input' (len of the first argument), 'output' (len of the
+                  result) or a function of (result, *args, **kwargs)
+    '''
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.span(label) as current:
+                result = func(*args, **kwargs)
+                if rows == 'input':
+                    current.rows = len(args[0])
+                elif rows == 'output':
+                    current.rows = len(result)
+                elif rows is not None:
+                    current.rows = rows(result, *args, **kwargs)
+            return result
+        return wrapper
+    return decorate
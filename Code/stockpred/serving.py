@@ -0,0 +1,319 @@
+"""
+Model export and the micro-batching HTTP forecast server. TensorFlow and torch are only imported for
+the models an export actually contains.
+"""
+
+import os
+import json
+import time
+import threading
+import queue
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from .data import price_store, process, get_stationary_data
+from .indicators import preprocess_data
+from .forecast import forecast_rollout
+
+"""# Serving"""
+
+def update_manifest(path, **entries):
+    '''
+    Merges entries into the manifest.json of an export directory
+    '''
+    os.makedirs(path, exist_ok=True)
+    manifest_path = os.path.join(path, 'manifest.json')
+    manifest = dict()
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    manifest.update(entries)
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+def export_models(models, modelnames, steps, path='models', tflite=()):
+    '''
+    Saves the trained Keras models (cnnmodel, lstmmodel, grumodel) for the forecast server
+
+    INPUT: models, their names, the window length they were trained on and the export directory
+           tflite - precisions ('float32', 'float16', 'int8') the models are also saved in as TFLite
+                    (see precision.export_tflite), to be served with keras_precision
+    '''
+    os.makedirs(path, exist_ok=True)
+    for model, name in zip(models, modelnames):
+        model.save(os.path.join(path, f'{name}.keras'))
+        if tflite:
+            from .precision import export_tflite
+            export_tflite(model, name, path, tflite)
+    update_manifest(path, steps=steps, keras=list(modelnames), tflite=list(tflite))
+
+def export_transformer(model, params, path='models', time_period=30, diff=12):
+    '''
+    Saves a trained TransformerModel checkpoint with its parameters for the forecast server
+
+    INPUT: the model, its parameter class, the export directory, the window length and the stationary diff
+           the model was trained with (on unscaled GetDataset features)
+    '''
+    import torch
+    os.makedirs(path, exist_ok=True)
+    params = {name: getattr(params, name) for name in dir(params) if not name.startswith('_')}
+    torch.save({'state_dict': model.state_dict(), 'params': params}, os.path.join(path, 'transformer.pt'))
+    update_manifest(path, transformer={'time_period': time_period, 'diff': diff})
+
+class MicroBatcher(object):
+    '''
+    Collects requests coming from many threads and hands them to handler in batches: a batch is closed
+    once it has max_batch requests or max_wait seconds after its first request came in
+
+    INPUT: handler - function of a list of requests returning the list of their results, an Exception
+                     in place of the result of a request fails that request only
+           max_batch - max requests per batch
+           max_wait - seconds a request can wait for others to join its batch
+    '''
+
+    def __init__(self, handler, max_batch=64, max_wait=0.005):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batch_sizes = deque(maxlen=10000)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, request):
+        '''
+            Output: result of the request, blocks until its batch has been handled
+        '''
+        done = threading.Event()
+        entry = {'request': request, 'done': done}
+        self.requests.put(entry)
+        done.wait()
+        if 'error' in entry:
+            raise entry['error']
+        return entry['result']
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.batch_sizes.append(len(batch))
+            try:
+                results = self.handler([entry['request'] for entry in batch])
+                for entry, result in zip(batch, results):
+                    entry['error' if isinstance(result, Exception) else 'result'] = result
+            except Exception as error:
+                for entry in batch:
+                    entry['error'] = error
+            for entry in batch:
+                entry['done'].set()
+
+class ForecastService(object):
+    '''
+    Keeps the exported models loaded and warm and answers forecast requests, micro-batched so that the
+    scrips of all the requests of a batch go through each model together (see forecast_rollout).
+    Keras models forecast the closes of the next days, the transformer the next close only (inverting the
+    stationary transform the same way plotTransformerResults does).
+
+    INPUT: path - export directory (export_models / export_transformer)
+           store - price store, defaults to price_store
+           max_batch, max_wait - micro-batching settings (see MicroBatcher)
+           keras_precision - 'keras' serves the Keras models, 'float32' / 'float16' / 'int8' their TFLite
+                             exports of that precision
+           transformer_precision - 'float32', 'bfloat16' or 'int8' (see precision.transformer_variant)
+           transformer_mode - 'eager', or 'trace' / 'compile' for a CompiledTransformer of the transformer
+    '''
+
+    def __init__(self, path='models', store=None, max_batch=64, max_wait=0.005, keras_precision='keras',
+                 transformer_precision='float32', transformer_mode='eager'):
+        start = time.perf_counter()
+        self.store = store if store is not None else price_store
+        with open(os.path.join(path, 'manifest.json')) as file:
+            self.manifest = json.load(file)
+        self.steps = self.manifest.get('steps')
+        if keras_precision == 'keras':
+            import tensorflow as tf
+            self.models = {name: tf.keras.models.load_model(os.path.join(path, f'{name}.keras'))
+                           for name in self.manifest.get('keras', [])}
+        else:
+            from .precision import TFLiteModel
+            if self.manifest.get('keras') and keras_precision not in self.manifest.get('tflite', []):
+                raise ValueError(f'{path} has no {keras_precision} TFLite export, see export_models')
+            self.models = {name: TFLiteModel(os.path.join(path, f'{name}.{keras_precision}.tflite'))
+                           for name in self.manifest.get('keras', [])}
+        self.transformer = None
+        if 'transformer' in self.manifest:
+            import torch
+            from .transformer import TransformerModel
+            checkpoint = torch.load(os.path.join(path, 'transformer.pt'))
+            params = type('params', (object,), checkpoint['params'])
+            self.transformer = TransformerModel(params)
+            self.transformer.load_state_dict(checkpoint['state_dict'])
+            if transformer_precision != 'float32':
+                from .precision import transformer_variant
+                self.transformer = transformer_variant(self.transformer, transformer_precision)
+            self.transformer.eval()
+            self.time_period = self.manifest['transformer']['time_period']
+            if transformer_mode != 'eager':
+                from .transformer import CompiledTransformer
+                self.transformer = CompiledTransformer(self.transformer, self.time_period, transformer_mode,
+                                                       sorted({1, max_batch}))
+            self.diff = self.manifest['transformer']['diff']
+        self.modelnames = list(self.models) + (['transformer'] if self.transformer is not None else [])
+
+        # one call per model so that the graphs are traced before the first request
+        for model in self.models.values():
+            forecast_rollout(model, np.zeros((1, self.steps, 1), dtype=np.float32), 1)
+        if self.transformer is not None:
+            with torch.no_grad():
+                self.transformer(torch.zeros(1, self.time_period, params.model_dim))
+
+        self.latencies = deque(maxlen=100000)
+        self.failed = deque(maxlen=100000)
+        self.batcher = MicroBatcher(self._handle, max_batch, max_wait)
+        self.cold_start_s = time.perf_counter() - start
+
+    def forecast(self, scrips, days=10, models=None):
+        '''
+            Input: scrips - tickers to forecast
+                   days - number of days forecast by the Keras models
+                   models - names of the models to use (default all, 'transformer' included)
+
+            Output: {scrip: {model: list of forecast closes}}
+        '''
+        start, failed = time.perf_counter(), True
+        try:
+            result = self.batcher.submit({'scrips': list(scrips), 'days': int(days), 'models': models})
+            failed = False
+            return result
+        finally:
+            ## failed requests count in the latencies too
+            self.latencies.append(time.perf_counter() - start)
+            self.failed.append(failed)
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        return {
+            'cold_start_s': self.cold_start_s,
+            'requests': len(latencies),
+            'errors': int(sum(self.failed)),
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'mean_batch_size': float(np.mean(self.batcher.batch_sizes)) if self.batcher.batch_sizes else None,
+        }
+
+    def _handle(self, requests):
+        ## a request naming an unknown model or a scrip that cannot be loaded gets its own error,
+        ## the other requests of the batch are still answered
+        errors = dict()
+        for k, request in enumerate(requests):
+            unknown = set(request['models'] or self.modelnames) - set(self.modelnames)
+            if unknown:
+                errors[k] = KeyError(f'Unknown models {sorted(unknown)}, serving {self.modelnames}')
+        frames, failed = dict(), dict()
+        for scrip in sorted({scrip for k, request in enumerate(requests) if k not in errors
+                             for scrip in request['scrips']}):
+            try:
+                frames[scrip] = self.store.load(scrip, '2019-01-01')
+            except Exception as error:
+                failed[scrip] = error
+        for k, request in enumerate(requests):
+            bad = [scrip for scrip in request['scrips'] if scrip in failed]
+            if k not in errors and bad:
+                errors[k] = failed[bad[0]]
+        requests = [request for k, request in enumerate(requests) if k not in errors]
+        scrips = sorted({scrip for request in requests for scrip in request['scrips']})
+        names = {name for request in requests for name in (request['models'] or self.modelnames)}
+        outputs = {scrip: dict() for scrip in scrips}
+
+        if self.models and scrips and names & set(self.models):
+            histories, scalers = [], []
+            for scrip in scrips:
+                data, scaler = process(np.array(frames[scrip]['Close']))
+                histories.append(data[-self.steps:])
+                scalers.append(scaler)
+            histories = np.stack(histories).astype(np.float32)
+            days = max(request['days'] for request in requests)
+            for name in names & set(self.models):
+                rollout = forecast_rollout(self.models[name], histories, days)
+                for k, scrip in enumerate(scrips):
+                    outputs[scrip][name] = scalers[k].inverse_transform(rollout[k].astype(np.float64))[:, 0]
+
+        if self.transformer is not None and scrips and 'transformer' in names:
+            import torch
+            windows, closes = [], []
+            for scrip in scrips:
+                x_df = frames[scrip][["Close", "Open", "High", "Low", "Volume"]]
+                features = preprocess_data(x_df.copy()).fillna(0)
+                features = get_stationary_data(features, features.columns, self.diff)
+                features = features.replace([np.inf, -np.inf], 0).fillna(0)
+                windows.append(features.values[-self.time_period:])
+                closes.append(np.log(x_df['Close'].values))
+            with torch.no_grad():
+                stationary = self.transformer(torch.tensor(np.stack(windows), dtype=torch.float32)).numpy()[:, 0]
+            for k, scrip in enumerate(scrips):
+                log_close = closes[k]
+                next_close = np.exp(stationary[k] + log_close[-1] + log_close[-self.diff] - log_close[-self.diff - 1])
+                outputs[scrip]['transformer'] = np.array([next_close])
+
+        results = iter({scrip: {name: outputs[scrip][name][:request['days']].tolist()
+                                for name in request['models'] or self.modelnames}
+                        for scrip in request['scrips']} for request in requests)
+        return [errors[k] if k in errors else next(results) for k in range(len(errors) + len(requests))]
+
+def serve(path='models', host='127.0.0.1', port=8000, **kwargs):
+    '''
+    Serves a ForecastService over HTTP:
+        POST /forecast with {"scrips": [...], "days": 10, "models": ["cnn", ...]} returns the forecasts
+        GET /stats returns the cold start time, the requests and errors and the p50 / p99 request latencies
+
+    INPUT: export directory, address to listen on and the arguments of ForecastService
+    '''
+    service = ForecastService(path, **kwargs)
+    print(f"Models loaded and warm in {service.cold_start_s:.2f}s, serving on http://{host}:{port}")
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, body):
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, service.stats())
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/forecast':
+                return self._reply(404, {'error': 'not found'})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self._reply(200, service.forecast(request['scrips'], request.get('days', 10), request.get('models')))
+            except Exception as error:
+                self._reply(400, {'error': str(error)})
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 256   ## concurrent clients waiting to be accepted
+        daemon_threads = True
+
+    server = Server((host, port), Handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+    return service
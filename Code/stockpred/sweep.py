@@ -0,0 +1,207 @@
+"""
+Hyperparameter sweeps with successive halving. The series is prepared once and saved next to the trial
+log; the worker processes memory map it and cut the windows of their steps / time_period as views.
+Every (trial, rung) result is appended to trials.jsonl, so an interrupted sweep resumes where it stopped.
+"""
+
+import os
+import json
+import time
+import hashlib
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .data import price_store, process, hash_data, GetDataset
+
+
+def sweep_data(scrip, kind='keras', start='2015-10-01', store=None, features=None):
+    '''
+        Input: scrip - ticker to tune on
+               kind - 'keras' (scaled closes, as process gives them) or 'transformer' (unscaled
+                      GetDataset features and targets, as the transformer is trained)
+               store - price store, defaults to price_store
+               features - FeatureStore the preprocessed series is cached in (e.g. feature_store), if given
+
+        Output: x_data, y_data arrays of shape (rows, features) and (rows, 1)
+    '''
+    store = store if store is not None else price_store
+    df = store.load(scrip, start)
+    if kind == 'keras':
+        data = process(np.array(df['Close']), store=features)[0]
+        return data, data
+    dataset = GetDataset(df, scrip)
+    dataset.get_dataset(scale=False, store=features)
+    return dataset.x_data, dataset.y_data
+
+def grid(space):
+    '''
+        Input: space - {parameter: list of values}
+
+        Output: list of the parameter dicts of every combination
+    '''
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def trial_id(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+def rung_epochs(min_epochs, max_epochs, eta):
+    '''
+        Output: cumulative epochs of every rung, min_epochs * eta**rung up to max_epochs
+    '''
+    epochs = [min_epochs]
+    while epochs[-1] * eta < max_epochs:
+        epochs.append(epochs[-1] * eta)
+    if epochs[-1] < max_epochs:
+        epochs.append(max_epochs)
+    return epochs
+
+def read_log(path):
+    '''
+        Output: list of the entries of the trial log of a sweep directory
+    '''
+    log_path = os.path.join(path, 'trials.jsonl')
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def split_ends(n_rows, window, val_fraction):
+    '''
+        Output: ends of the training and the validation windows, the validation rows being the last ones
+    '''
+    boundary = max(window + 1, int(n_rows * (1 - val_fraction)))
+    return np.arange(window, boundary), np.arange(boundary, n_rows)
+
+## trains a Keras trial from its previous rung's weights up to epochs, returns its validation mse
+def keras_trial(path, params, epochs, previous, weights, previous_weights, val_fraction, threads):
+    import tensorflow as tf
+    from . import keras_models
+    from .keras_models import WindowBatches
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    x = np.load(os.path.join(path, 'x.npy'), mmap_mode='r')
+    y = np.load(os.path.join(path, 'y.npy'), mmap_mode='r')
+    steps, batch_size = params['steps'], params.get('batch_size', 32)
+    train_ends, val_ends = split_ends(len(x), steps, val_fraction)
+
+    model = getattr(keras_models, f"{params.get('model', 'cnn')}model")(steps)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=params.get('lr', 0.001)), loss='mse')
+    if previous_weights is not None:
+        model.load_weights(previous_weights)
+    model.fit(WindowBatches(x, steps, batch_size, targets=y, shuffle=True, ends=train_ends),
+              epochs=epochs - previous, verbose=0)
+    model.save_weights(weights)
+    return float(model.evaluate(WindowBatches(x, steps, 1024, targets=y, ends=val_ends), verbose=0))
+
+## same for a transformer trial, params override transf_params and time_period is the window length
+def transformer_trial(path, params, epochs, previous, weights, previous_weights, val_fraction, threads):
+    import torch
+    from .transformer import transf_params, TransformerModel, Classifier, WindowDataset
+    torch.set_num_threads(threads)
+    x = np.load(os.path.join(path, 'x.npy'), mmap_mode='r')
+    y = np.load(os.path.join(path, 'y.npy'), mmap_mode='r')
+    time_period = params['time_period']
+    train_ends, val_ends = split_ends(len(x), time_period, val_fraction)
+
+    trial_params = type('params', (transf_params,), {**params, 'n_epochs': epochs - previous})
+    clf = Classifier(TransformerModel(trial_params))
+    if previous_weights is not None:
+        clf.model.load_state_dict(torch.load(previous_weights))
+    clf.train_batches(WindowDataset(x, y, time_period, train_ends), trial_params)
+    torch.save(clf.model.state_dict(), weights)
+
+    clf.model.eval()
+    loader = torch.utils.data.DataLoader(WindowDataset(x, y, time_period, val_ends), batch_size=1024)
+    with torch.no_grad():
+        errors = [float(torch.sum((clf.model(x_batch) - y_batch) ** 2)) for x_batch, y_batch in loader]
+    return sum(errors) / max(len(val_ends), 1)
+
+def sweep(space, x_data, y_data, path='sweep', kind='keras', min_epochs=1, max_epochs=9, eta=3, val_fraction=0.2,
+          workers=None, threads=1, context='spawn'):
+    '''
+    Successive halving over the grid of space: every trial is trained for the epochs of the first rung, the
+    best 1/eta of them (by validation mse) continue from their weights up to the epochs of the next rung,
+    and so on until max_epochs
+
+    INPUT: space - {parameter: list of values}, 'steps' (and 'model': cnn / lstm / gru, 'lr', 'batch_size')
+                   for keras, 'time_period' and any transf_params attribute for the transformer
+           x_data, y_data - series the trials are trained on (see sweep_data), the last val_fraction of
+                            the rows is kept for validation
+           path - directory of the data, weights and trial log; a sweep over the same data resumes from it
+           kind - 'keras' or 'transformer'
+           min_epochs, max_epochs, eta - epochs of the first and the last rung and the halving rate
+           workers - trial processes, threads - TensorFlow / torch threads of every process
+           context - multiprocessing start method
+
+    A trial that raises (e.g. out of memory, or parameters the model cannot be built with) is logged with
+    a NaN validation mse and its error, and ranks last.
+
+    OUTPUT: DataFrame of the trials (parameters, epochs reached and last validation mse), best first
+    '''
+    os.makedirs(os.path.join(path, 'weights'), exist_ok=True)
+    x_data = np.ascontiguousarray(x_data, dtype=np.float32).reshape(len(x_data), -1)
+    y_data = np.ascontiguousarray(y_data, dtype=np.float32).reshape(len(y_data), 1)
+    meta = {'kind': kind, 'data': hash_data(x_data) + hash_data(y_data)}
+    meta_path = os.path.join(path, 'sweep.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            if json.load(file) != meta:
+                raise ValueError(f'{path} holds a sweep of other data or models, use another path')
+    else:
+        np.save(os.path.join(path, 'x.npy'), x_data)
+        np.save(os.path.join(path, 'y.npy'), y_data)
+        with open(meta_path, 'w') as file:
+            json.dump(meta, file)
+
+    run_trial = keras_trial if kind == 'keras' else transformer_trial
+    extension = 'weights.h5' if kind == 'keras' else 'pt'
+    trials = {trial_id(params): params for params in grid(space)}
+    done = {(entry['trial'], entry['epochs']): entry for entry in read_log(path)}
+    epochs = rung_epochs(min_epochs, max_epochs, eta)
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+
+    def weights(trial, n_epochs):   ## keyed by epochs so that a resumed sweep can change its rungs
+        return os.path.join(path, 'weights', f'{trial}.e{n_epochs}.{extension}')
+
+    survivors = list(trials)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(context)) as pool, \
+            open(os.path.join(path, 'trials.jsonl'), 'a') as log:
+        for rung, rung_epoch in enumerate(epochs):
+            futures = dict()
+            previous = epochs[rung - 1] if rung else 0
+            for trial in survivors:
+                if (trial, rung_epoch) in done:
+                    continue
+                future = pool.submit(run_trial, path, trials[trial], rung_epoch, previous, weights(trial, rung_epoch),
+                                     weights(trial, previous) if rung else None, val_fraction, threads)
+                futures[future] = (trial, time.perf_counter())
+            for future in as_completed(futures):
+                trial, start = futures[future]
+                entry = {'trial': trial, 'params': trials[trial], 'rung': rung, 'epochs': rung_epoch}
+                try:
+                    entry['val_loss'] = future.result()
+                except Exception as error:   ## e.g. out of memory, the trial ranks last
+                    entry.update({'val_loss': float('nan'), 'error': repr(error)})
+                    print(f"Trial {trial} {trials[trial]} failed: {error!r}")
+                entry['time_s'] = time.perf_counter() - start
+                log.write(json.dumps(entry) + '\n')
+                log.flush()
+                done[(trial, rung_epoch)] = entry
+                print(f"Trial {trial} {trials[trial]} - {rung_epoch} epochs, validation mse {entry['val_loss']:.6f}")
+
+            losses = {trial: done[(trial, rung_epoch)]['val_loss'] for trial in survivors}
+            ranked = sorted(survivors, key=lambda trial: np.inf if np.isnan(losses[trial]) else losses[trial])
+            if rung < len(epochs) - 1:
+                survivors = ranked[:max(1, int(np.ceil(len(ranked) / eta)))]
+
+    rows = []
+    for trial, params in trials.items():
+        last = max((entry for (name, _), entry in done.items() if name == trial), key=lambda entry: entry['epochs'])
+        rows.append({'trial': trial, **params, 'epochs': last['epochs'], 'val_loss': last['val_loss'],
+                     'weights': weights(trial, last['epochs'])})
+    return pd.DataFrame(rows).sort_values(['epochs', 'val_loss'], ascending=[False, True]).reset_index(drop=True)
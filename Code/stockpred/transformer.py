@@ -0,0 +1,639 @@
+"""
+Transformer encoder forecaster in torch and the Classifier used to train it.
+"""
+
+import json
+import time
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.utils.checkpoint
+import torch.nn.functional as f
+
+from .data import peak_memory_mb, sliding_windows
+from .profiling import profiled
+
+"""# Datasets"""
+
+class WindowDataset(torch.utils.data.Dataset):
+    '''
+    Torch dataset that cuts the window x_data[end-time_period:end] and its target y_data[end] only when
+    an item is requested, for mini-batch training through a DataLoader
+
+    INPUT: x_data - array of shape (rows, features)
+           y_data - array of shape (rows, 1)
+           time_period - length of a window
+           ends - rows whose preceding window makes an item, defaults to every row from time_period on
+    '''
+
+    def __init__(self, x_data, y_data, time_period, ends=None):
+        super().__init__()
+        self.x_data = x_data
+        self.y_data = y_data
+        self.time_period = time_period
+        self.ends = np.arange(time_period, len(x_data)) if ends is None else np.asarray(ends)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, idx):
+        end = self.ends[idx]
+        if np.ndim(end):   ## a whole batch of items, gathered at once (see BalancedBatchSampler)
+            windows = sliding_windows(self.x_data, self.time_period)[end - self.time_period]
+            return torch.from_numpy(windows.astype(np.float32)), torch.from_numpy(self.y_data[end].astype(np.float32))
+        x = np.array(self.x_data[end - self.time_period:end], dtype=np.float32)
+        y = np.array(self.y_data[end], dtype=np.float32)
+        return torch.from_numpy(x), torch.from_numpy(y)
+
+class BalancedBatchSampler(torch.utils.data.Sampler):
+    '''
+    Draws mini-batches that take the same number of windows (up to one) from every ticker, whatever the
+    length of their histories, so that no ticker dominates the training of a multi-ticker model. Every
+    batch is an array of item positions, to be passed to a DataLoader with batch_size=None so the
+    WindowDataset gathers it in one go.
+
+    INPUT: groups - ticker (any integer code) of every item of the dataset
+           batch_size - items per batch
+           n_batches - batches per epoch, defaults to as many as the items fill
+           seed - random seed
+    '''
+
+    def __init__(self, groups, batch_size=32, n_batches=None, seed=None):
+        groups = np.asarray(groups)
+        self.order = np.argsort(groups, kind='stable')
+        codes, self.starts, self.counts = np.unique(groups[self.order], return_index=True, return_counts=True)
+        self.batch_size = batch_size
+        self.n_batches = n_batches or int(np.ceil(len(groups) / batch_size))
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n_batches
+
+    def __iter__(self):
+        n_groups = len(self.counts)
+        for _ in range(self.n_batches):
+            groups = np.resize(self.rng.permutation(n_groups), self.batch_size)
+            positions = self.starts[groups] + (self.rng.random(self.batch_size) * self.counts[groups]).astype(np.int64)
+            yield self.order[positions]
+
+"""# Implementation of a transformer model"""
+
+def scaled_dot_product_attention(query, key, value):
+    '''
+    Computes the local fields and the attention of the inputs as described in Vaswani et. al.
+    and then scale it for a total sum of 1
+
+    INPUT: query, key, value - input data of size (batch_size, seq_length, num_features)
+    '''
+
+    temp = query.bmm(key.transpose(1, 2))
+    scale = query.size(-1) ** 0.5
+    softmax = f.softmax(temp / scale, dim=-1)
+    attention = softmax.bmm(value)
+    return attention
+
+def batched_attention(query, key, value):
+    '''
+    Scaled dot-product attention of all the heads at once, with torch's fused kernel when it is available
+
+    INPUT: query, key, value - input data of size (batch_size, num_heads, seq_length, head_dim)
+    '''
+    if hasattr(f, 'scaled_dot_product_attention'):
+        return f.scaled_dot_product_attention(query, key, value)
+    scale = query.size(-1) ** 0.5
+    return f.softmax(query @ key.transpose(-2, -1) / scale, dim=-1) @ value
+
+class MultiHeadAttention(nn.Module):
+    '''
+    Computes the multihead head consisting of a feedforward layer for each input value
+    where the attention for all of these are computed for each head and then concatenated and projected
+    as described in Vaswani et. al.
+    The projections of all the heads are packed into one linear layer (qkv) and the heads are attended in a
+    single batched call. With shared_heads the old layout is kept instead: one query/key/value projection
+    shared by every head, so the heads are identical and their attention is computed only once.
+    Checkpoints of the old layout can also be loaded without shared_heads, the shared projection is then
+    copied into every head which gives the same outputs.
+
+    INPUT: dimensions of the three matrices (where the key and query matrix has the same dimensions) and the nr of heads
+    OUTPUT: the projected output of the multihead attention
+    '''
+
+    def __init__(self, num_heads, input_dim, key_dim, value_dim, shared_heads=False):
+        super().__init__()
+        self.num_heads = num_heads
+        self.key_dim = key_dim
+        self.value_dim = value_dim
+        self.shared_heads = shared_heads
+        if shared_heads:
+            self.query = nn.Linear(input_dim, key_dim)
+            self.key = nn.Linear(input_dim, key_dim)
+            self.value = nn.Linear(input_dim, value_dim)
+        else:
+            self.qkv = nn.Linear(input_dim, num_heads * (2 * key_dim + value_dim))
+
+        self.linear = nn.Linear(num_heads * value_dim, input_dim)
+
+    def forward(self, query, key, value):
+        if self.shared_heads:
+            head = scaled_dot_product_attention(self.query(query), self.key(key), self.value(value))
+            return self.linear(head.repeat(1, 1, self.num_heads))
+
+        sizes = [self.num_heads * self.key_dim, self.num_heads * self.key_dim, self.num_heads * self.value_dim]
+        if query is key and key is value:
+            q, k, v = self.qkv(query).split(sizes, dim=-1)
+        else:
+            weights, biases = self.qkv.weight.split(sizes), self.qkv.bias.split(sizes)
+            q, k, v = (f.linear(x, w, b) for x, w, b in zip((query, key, value), weights, biases))
+
+        batch_size = query.size(0)
+        q = q.view(batch_size, -1, self.num_heads, self.key_dim).transpose(1, 2)
+        k = k.view(batch_size, -1, self.num_heads, self.key_dim).transpose(1, 2)
+        v = v.view(batch_size, -1, self.num_heads, self.value_dim).transpose(1, 2)
+        out = batched_attention(q, k, v).transpose(1, 2).reshape(batch_size, -1, self.num_heads * self.value_dim)
+        return self.linear(out)
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        if not self.shared_heads and prefix + 'query.weight' in state_dict:
+            # checkpoint with the shared layout, repeat its projection for every head
+            for param in ('weight', 'bias'):
+                packed = [state_dict.pop(prefix + f'{name}.{param}') for name in ('query', 'key', 'value')]
+                state_dict[prefix + f'qkv.{param}'] = torch.cat(
+                    [tensor.repeat(self.num_heads, *[1] * (tensor.dim() - 1)) for tensor in packed])
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+def positioning_encoding(seq_length, model_dim):
+    '''
+    Computes the positional encoding for the current state of the elements in the input sequence as
+    there is no recurrence or convolution. Using the same encoding with sinusosoidal functions as in Vaswani et. al.
+    as the motivations of linearly dependency of the relative positions and the ability to extrapolate to sequence lengths
+    longer than encountered in training holds strong.
+    Code copied from Frank Odom
+
+    INPUT: length of the input sequence and the dimension of the model
+    OUTPUT: Encoded relative positions of the data points in the input sequence
+    '''
+    position = torch.arange(seq_length, dtype=torch.float).reshape(1, -1, 1)
+    frequencies = 1e-4 ** (2 * (torch.arange(model_dim, dtype=torch.float) // 2) / model_dim).reshape(1, 1, -1)
+    pos_enc = position * frequencies
+    pos_enc[:, ::2] = torch.cos(pos_enc[:, ::2])
+    pos_enc[:, 1::2] = torch.sin(pos_enc[:, 1::2])
+    return pos_enc
+
+class PositionalEncoding(nn.Module):
+    '''
+    Keeps the positional encodings of positioning_encoding in a buffer (moved along with the model, not saved
+    in checkpoints) and caches them per sequence length, dtype and device, so that they are computed once
+    rather than on every forward pass. The encoding of a sequence is a prefix of the encoding of any longer
+    one, so the buffer is only recomputed when a longer sequence than max_length comes in.
+
+    INPUT: dimension of the model and the initial max sequence length
+    OUTPUT: encodings of size (1, seq_length, model_dim)
+    '''
+
+    def __init__(self, model_dim, max_length=512):
+        super().__init__()
+        self.model_dim = model_dim
+        self.register_buffer('encoding', positioning_encoding(max_length, model_dim), persistent=False)
+        self._cache = dict()
+
+    def forward(self, seq_length, dtype, device):
+        key = (seq_length, dtype, device)
+        if key not in self._cache:
+            if seq_length > self.encoding.size(1):
+                self.encoding = positioning_encoding(seq_length, self.model_dim).to(self.encoding.device)
+            self._cache[key] = self.encoding[:, :seq_length].to(dtype=dtype, device=device)
+        return self._cache[key]
+
+def forward(input_dim=512, forward_dim=2048):
+    '''
+    Forward class for the feed-forward layer that is following the multihead
+    attention layers
+
+    INPUT: input dimension and the layer size of the forward layer
+    OUTPUT: feed-forward layer (nn.Module)
+    '''
+    forward_layer = nn.Sequential(
+        nn.Linear(input_dim, forward_dim),
+        nn.ReLU(),
+        nn.Linear(forward_dim, input_dim)
+    )
+    return forward_layer
+
+class ResidualConnection(nn.Module):
+    '''
+    Class for the residual connections for the encoder and the decoder, used for each multihead attention layer
+    and for each feed-forward layer
+
+    INPUT: type of layer, dimension for the layer normalization and dropout probability factor
+    OUTPUT: Normalized and processed tensors added to the input tensors
+    '''
+
+    def __init__(self, layer, dimension, dropout=0.2):
+        super().__init__()
+        self.layer = layer
+        self.norm = nn.LayerNorm(dimension)
+        self.dropout = nn.Dropout(dropout)
+
+    def forward(self, *X):
+        return self.norm(X[-1] + self.dropout(self.layer(*X)))
+
+def encoder_block(multihead_attention, feed_forward, X):
+    # One layer of the encoder: the multihead attention followed by the feed-forward layer
+    return feed_forward(multihead_attention(X, X, X))
+
+class EncoderLayer(nn.Module):
+    '''
+    One layer of the encoder with its own weights: the multihead attention followed by the feed-forward
+    layer, both with normalized residual connections
+
+    INPUT: dimension of the model, nr of heads, layer size of the feed-forward layer, dropout and the
+           attention layout (see MultiHeadAttention)
+    '''
+
+    def __init__(self, model_dim=512, num_heads=8, forward_dim=2048, dropout=0.2, shared_heads=False):
+        super().__init__()
+        key_dim = value_dim = model_dim // num_heads
+        self.multihead_attention = ResidualConnection(
+            MultiHeadAttention(num_heads, model_dim, key_dim, value_dim, shared_heads),
+            dimension=model_dim,
+            dropout=dropout
+        )
+        self.feed_forward = ResidualConnection(
+            forward(model_dim, forward_dim),
+            dimension=model_dim,
+            dropout=dropout
+        )
+
+    def forward(self, X):
+        return encoder_block(self.multihead_attention, self.feed_forward, X)
+
+class Encoder(nn.Module):
+    '''
+    The encoder of the transformer model, first computes the relative positions of the inputs, then feeds it into
+    the multihead attention followed by the feed-forward layer, both with normalized residual connections.
+    With shared_layers one multihead_attention and one feed_forward are applied n_layers times (the original
+    layout: the parameters of one layer for the compute of n_layers), otherwise every layer has its own
+    weights (self.layers). Checkpoints of the shared layout can be loaded without shared_layers, their layer
+    is then copied into every layer which gives the same outputs.
+    With checkpoint the activations inside every layer are not kept for the backward pass but recomputed
+    during it, so training memory grows with the number of layers by one layer input only.
+    '''
+
+    def __init__(self, n_layers=6, model_dim=512, num_heads=8, forward_dim=2048, dropout=0.2, shared_heads=False,
+                 shared_layers=True, checkpoint=False):
+        super().__init__()
+
+        self.n_layers = n_layers
+        self.shared_layers = shared_layers
+        self.checkpoint = checkpoint
+
+        self.positional_encoding = PositionalEncoding(model_dim)
+
+        if shared_layers:
+            # Multihead attention and feed-forward layers with normalized residual connections and dropout,
+            # applied by every layer
+            layer = EncoderLayer(model_dim, num_heads, forward_dim, dropout, shared_heads)
+            self.multihead_attention = layer.multihead_attention
+            self.feed_forward = layer.feed_forward
+        else:
+            self.layers = nn.ModuleList(EncoderLayer(model_dim, num_heads, forward_dim, dropout, shared_heads)
+                                        for _ in range(n_layers))
+
+    def blocks(self):
+        '''
+            Output: (multihead_attention, feed_forward) of every layer, the same pair n_layers times when shared
+        '''
+        if self.shared_layers:
+            return [(self.multihead_attention, self.feed_forward)] * self.n_layers
+        return [(layer.multihead_attention, layer.feed_forward) for layer in self.layers]
+
+    def forward(self, X):
+        # Adds the (cached) positional encodings, out of place so that X is left untouched
+        out = X + self.positional_encoding(X.size(1), X.dtype, X.device)
+        # Feeds the input to the multihead attention layer followed by the feed-forward
+        # layer for 'n_layers' many layers
+        recompute = self.checkpoint and self.training and torch.is_grad_enabled()
+        for multihead_attention, feed_forward in self.blocks():
+            if recompute:
+                out = torch.utils.checkpoint.checkpoint(encoder_block, multihead_attention, feed_forward, out,
+                                                        use_reentrant=False)
+            else:
+                out = encoder_block(multihead_attention, feed_forward, out)
+        return out
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        if not self.shared_layers and any(key.startswith(prefix + 'multihead_attention.') for key in state_dict):
+            # checkpoint with shared layers, repeat its layer for every layer
+            for key in [key for key in state_dict if key.startswith((prefix + 'multihead_attention.',
+                                                                     prefix + 'feed_forward.'))]:
+                value = state_dict.pop(key)
+                for index in range(self.n_layers):
+                    state_dict[f'{prefix}layers.{index}.{key[len(prefix):]}'] = value.clone()
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+class transformerModel(nn.Module):
+    def __init__(self, n_layers=6, model_dim=512, output_dim=512,
+                 num_heads=6, forward_dim=2048, dropout=0.2, shared_heads=False, shared_layers=True,
+                 checkpoint=False):
+        super().__init__()
+        self.encoder = Encoder(n_layers, model_dim, num_heads, forward_dim, dropout, shared_heads, shared_layers,
+                               checkpoint)
+        self.flatten = nn.Flatten()
+        self.linear = nn.Linear(16, output_dim)
+        self.relu = nn.ReLU(inplace=True)
+
+    def forward(self, X):
+        enc_out = self.encoder(X)
+        #flat = self.flatten(enc_out)
+        out = self.relu(self.linear(enc_out[:, -1, :]))
+
+        return out
+
+class transf_params:
+    n_layers = 11
+    num_heads = 6
+    model_dim = 16  # nr of features
+    forward_dim = 128
+    output_dim = 1
+    dropout = 0
+    shared_heads = False  # True keeps the old single-projection attention layout
+    shared_layers = True  # False gives every encoder layer its own weights
+    checkpoint = False  # recompute the activations of every encoder layer in the backward pass
+    n_epochs = 100
+    lr = 0.01
+    batch_size = 32
+    # mini-batch training (Classifier.train given a WindowDataset)
+    shuffle = True
+    num_workers = 0
+    pin_memory = False
+    prefetch_factor = 2
+
+class TransformerModel(nn.Module):
+    def __init__(self, params):
+        super(TransformerModel, self).__init__()
+        self.transf = transformerModel(n_layers=params.n_layers,
+                                                   num_heads=params.num_heads,
+                                                   model_dim=params.model_dim,
+                                                   forward_dim=params.forward_dim,
+                                                   output_dim=16,
+                                                   dropout=params.dropout,
+                                                   shared_heads=params.shared_heads,
+                                                   shared_layers=getattr(params, 'shared_layers', True),
+                                                   checkpoint=getattr(params, 'checkpoint', False))
+        self.linear = nn.Linear(16, params.output_dim)
+    def forward(self, x):
+        transf_out = self.transf(x)
+        out = self.linear(transf_out)
+        return out
+
+"""# Static-shape inference"""
+
+class CompiledTransformer(object):
+    '''
+    Fast inference path of a trained TransformerModel for windows of a fixed (time_period, model_dim): the
+    model is traced to a frozen TorchScript graph (mode='trace', the loops over the layers and the heads are
+    unrolled into it) or compiled with torch.compile (mode='compile'), and always run under
+    torch.inference_mode. Windows are copied into one preallocated float32 input buffer (skipped for
+    contiguous float32 batches when tracing) and the predictions are written into a preallocated array.
+    Compiled, every batch is padded up to one of batch_sizes so that only those shapes are ever compiled.
+    Like the model it wraps, a trace does not follow later training: compile after training.
+
+    INPUT: model - TransformerModel, or one of its precision.transformer_variant
+           time_period - length of a window
+           mode - 'trace' or 'compile'
+           batch_sizes - batch sizes warmed up at creation, the largest is the chunk size of predict
+           model_dim - features of a window, read from the model by default
+    '''
+
+    def __init__(self, model, time_period, mode='trace', batch_sizes=(1, 32, 1024), model_dim=None):
+        if mode not in ('trace', 'compile'):
+            raise ValueError(f"Unknown mode {mode}, 'trace' or 'compile'")
+        if mode == 'trace' and not isinstance(model, nn.Module):
+            raise ValueError("Autocast models cannot be traced, use mode='compile'")
+        model.eval()
+        self.time_period = time_period
+        self.model_dim = model_dim or getattr(model, 'model', model).transf.encoder.positional_encoding.model_dim
+        self.mode = mode
+        self.batch_sizes = sorted(batch_sizes)
+        self.inputs = torch.zeros(self.batch_sizes[-1], time_period, self.model_dim)
+
+        start = time.perf_counter()
+        with torch.inference_mode():
+            if mode == 'trace':
+                with warnings.catch_warnings():   ## the deprecation and constant shape warnings of tracing
+                    warnings.simplefilter('ignore')
+                    traced = torch.jit.trace(model, self.inputs[:1], check_trace=False)
+                    self.module = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+            else:
+                self.module = torch.compile(model, dynamic=False)
+            for batch_size in self.batch_sizes:
+                for _ in range(2):   ## the TorchScript executor optimizes the graph on its second run
+                    self.output_dim = self.module(self.inputs[:batch_size]).shape[-1]
+        self.setup_s = time.perf_counter() - start
+
+    @classmethod
+    def load(cls, path, batch_sizes=(1, 32, 1024)):
+        '''
+            Output: CompiledTransformer of a trace written by save
+        '''
+        extra_files = {'shape.json': ''}
+        module = torch.jit.load(path, _extra_files=extra_files)
+        shape = json.loads(extra_files['shape.json'])
+        compiled = cls.__new__(cls)
+        compiled.module = module
+        compiled.time_period, compiled.model_dim = shape['time_period'], shape['model_dim']
+        compiled.mode = 'trace'
+        compiled.batch_sizes = sorted(batch_sizes)
+        compiled.inputs = torch.zeros(compiled.batch_sizes[-1], compiled.time_period, compiled.model_dim)
+        with torch.inference_mode():
+            compiled.output_dim = module(compiled.inputs[:1]).shape[-1]
+        compiled.setup_s = 0.0
+        return compiled
+
+    def save(self, path):
+        '''
+            Writes the traced graph with its window shape, to be loaded without the model code
+        '''
+        if self.mode != 'trace':
+            raise ValueError('Only traced models can be saved')
+        shape = json.dumps({'time_period': self.time_period, 'model_dim': self.model_dim})
+        torch.jit.save(self.module, path, _extra_files={'shape.json': shape})
+
+    def __call__(self, x):
+        return torch.from_numpy(self.predict(np.asarray(x)))
+
+    def predict(self, windows, out=None):
+        '''
+            Input: windows - array of shape (windows, time_period, model_dim), e.g. the window views of split
+                   out - float32 array of shape (windows, output_dim) the predictions are written into,
+                         allocated when not given (pass the same one on every call to reuse it)
+
+            Output: out
+        '''
+        if windows.shape[1:] != (self.time_period, self.model_dim):
+            raise ValueError(f'Windows of shape {windows.shape[1:]}, compiled for {(self.time_period, self.model_dim)}')
+        if out is None:
+            out = np.empty((len(windows), self.output_dim), dtype=np.float32)
+        chunk_size = self.batch_sizes[-1]
+        with torch.inference_mode():
+            for start in range(0, len(windows), chunk_size):
+                chunk = windows[start:start + chunk_size]
+                n = len(chunk)
+                if self.mode == 'trace' and chunk.dtype == np.float32 and chunk.flags.c_contiguous:
+                    x = torch.from_numpy(chunk)
+                else:
+                    size = n if self.mode == 'trace' else next(size for size in self.batch_sizes if size >= n)
+                    self.inputs.numpy()[:n] = chunk
+                    x = self.inputs[:size]
+                out[start:start + n] = self.module(x)[:n].numpy()
+        return out
+
+class Classifier(object):
+    def __init__(self, model):
+        self.model = model
+        self.compiled = None
+
+    @profiled(rows=lambda result, self, train_data, *args, **kwargs:
+              len(train_data) if isinstance(train_data, torch.utils.data.Dataset) else len(train_data[0]))
+    def train(self, train_data, params):
+        '''
+            Input: train_data - list of input values (numpy array) and target values
+                                (numpy array) of training data, trained on as one batch,
+                                or a torch Dataset (e.g. GetDataset.get_window_dataset) trained
+                                on in mini-batches of params.batch_size
+                   model - model to be trained
+                   show_progress - if the training process is showed (boolean)
+
+        '''
+        if isinstance(train_data, torch.utils.data.Dataset):
+            return self.train_batches(train_data, params)
+
+        self.x_train, self.y_train = train_data
+        criterion = torch.nn.MSELoss(reduction='mean')
+        optimiser = torch.optim.Adam(self.model.parameters(), lr=params.lr)
+        hist = np.zeros(params.n_epochs)
+        self.model.train()
+        for epoch in range(params.n_epochs):
+            y_train_pred = self.model(self.x_train)
+            loss = criterion(y_train_pred, self.y_train)
+            optimiser.zero_grad()
+            loss.backward()
+            optimiser.step()
+            print(f'Epoch: {epoch+1}/{params.n_epochs}\tMSE loss: {loss.item():.5f}')
+            hist[epoch] = loss.item()
+
+        return hist
+
+
+    def train_batches(self, dataset, params, sampler=None):
+        '''
+            Input: dataset - torch Dataset of (window, target) pairs
+                   params - training parameters, uses batch_size, shuffle, num_workers,
+                            pin_memory and prefetch_factor besides n_epochs and lr
+                   sampler - if given, yields the batches of item positions instead of
+                             params.batch_size / shuffle (e.g. BalancedBatchSampler)
+
+            Output: hist - mean MSE loss of every epoch, the throughput (samples/s) and
+                    peak memory (MB) of every epoch are kept in self.epoch_stats
+        '''
+        device = next(self.model.parameters()).device
+        loader = torch.utils.data.DataLoader(
+            dataset,
+            batch_size=params.batch_size if sampler is None else None,
+            shuffle=params.shuffle if sampler is None else None,
+            sampler=sampler,
+            num_workers=params.num_workers,
+            pin_memory=params.pin_memory,
+            persistent_workers=params.num_workers > 0,
+            prefetch_factor=params.prefetch_factor if params.num_workers > 0 else None,
+        )
+        criterion = torch.nn.MSELoss(reduction='mean')
+        optimiser = torch.optim.Adam(self.model.parameters(), lr=params.lr)
+        hist = np.zeros(params.n_epochs)
+        self.epoch_stats = []
+        self.model.train()
+        for epoch in range(params.n_epochs):
+            start = time.perf_counter()
+            total_loss, n_samples = 0.0, 0
+            for x_batch, y_batch in loader:
+                x_batch = x_batch.to(device, non_blocking=True)
+                y_batch = y_batch.to(device, non_blocking=True)
+                loss = criterion(self.model(x_batch), y_batch)
+                optimiser.zero_grad()
+                loss.backward()
+                optimiser.step()
+                total_loss += loss.item() * len(x_batch)
+                n_samples += len(x_batch)
+            elapsed = time.perf_counter() - start
+            hist[epoch] = total_loss / max(n_samples, 1)
+            stats = {'samples_per_s': n_samples / elapsed, 'peak_memory_mb': peak_memory_mb()}
+            self.epoch_stats.append(stats)
+            print(f'Epoch: {epoch+1}/{params.n_epochs}\tMSE loss: {hist[epoch]:.5f}'
+                  f'\t{stats["samples_per_s"]:.0f} samples/s\tpeak memory: {stats["peak_memory_mb"]:.0f} MB')
+
+        return hist
+
+    def train_corpus(self, corpus, params, time_period=30, tickers=None, balanced=True, seed=None):
+        '''
+            Input: corpus - WindowCorpus of many tickers (e.g. WindowCorpus.from_datasets, every
+                            ticker scaled with its own scalers)
+                   params - as in train_batches
+                   time_period - length of a window
+                   tickers - tickers trained on, all by default
+                   balanced - if every batch draws as many windows from every ticker
+                              (BalancedBatchSampler), else they are drawn as in train_batches
+                   seed - random seed of the balanced batches
+
+            Output: hist - as in train_batches, one model is trained on the windows of all the tickers
+        '''
+        dataset = corpus.dataset(time_period, tickers)
+        sampler = None
+        if balanced:
+            codes, _ = corpus.window_index(time_period, tickers)
+            sampler = BalancedBatchSampler(codes, params.batch_size, seed=seed)
+        return self.train_batches(dataset, params, sampler)
+
+
+    def compile(self, time_period, mode='trace', batch_sizes=(1, 32, 1024)):
+        '''
+            Input: time_period - window length the model will predict on
+                   mode, batch_sizes - see CompiledTransformer
+
+            Output: the CompiledTransformer of the trained model, used by predict from now on
+        '''
+        self.compiled = CompiledTransformer(self.model, time_period, mode, batch_sizes)
+        return self.compiled
+
+    @profiled(rows='output')
+    def predict(self, test_data, scaler, data_scaled=True, batch_size=None):
+        '''
+            Input: test_data - list of input values (numpy array) and target values
+                               (numpy array) of validation data
+                   scaler - scaler object to inversely scale predictions
+                   data_scaled - if scaler were used in the preprocessing (boolean)
+                   batch_size - if given, the inputs (e.g. the window views from split) are
+                                converted and predicted batch_size windows at a time
+                                (after compile, the CompiledTransformer predicts instead)
+
+            Output: predictions - numpy array of the predicted values
+        '''
+
+
+        self.x_test, self.y_test = test_data
+        self.model.eval()
+        if self.compiled is not None:
+            predictions = self.compiled.predict(np.asarray(self.x_test, dtype=np.float32))
+        elif batch_size is None:
+            predictions = self.model(self.x_test).detach().numpy()
+        else:
+            with torch.no_grad():
+                predictions = np.concatenate([
+                    self.model(torch.tensor(self.x_test[i:i + batch_size], dtype=torch.float32)).numpy()
+                    for i in range(0, len(self.x_test), batch_size)
+                ])
+        if data_scaled:
+            predictions = scaler.inverse_transform(predictions)
+
+        return predictions
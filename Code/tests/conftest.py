@@ -0,0 +1,33 @@
+"""
+Fixtures shared by the tests: synthetic bars and an offline price store serving them
+"""
+
+import pytest
+
+from stockpred.bench import SyntheticSource
+from stockpred.data import PriceStore, synthetic_ohlcv
+
+
+@pytest.fixture
+def bars():
+    '''
+    2000 random-walk OHLCV bars
+    '''
+    return synthetic_ohlcv(2000, seed=1)
+
+
+@pytest.fixture
+def store(tmp_path):
+    '''
+    Offline PriceStore of 700 synthetic daily bars per scrip
+    '''
+    return PriceStore(str(tmp_path / 'prices'), offline=True, fixtures=SyntheticSource(700))
+
+
+@pytest.fixture
+def small_params():
+    '''
+    transf_params of a small transformer: 3 layers of 2 heads
+    '''
+    from stockpred.transformer import transf_params
+    return type('params', (transf_params,), {'n_layers': 3, 'num_heads': 2, 'forward_dim': 32})
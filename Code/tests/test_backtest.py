@@ -0,0 +1,19 @@
+"""
+Tests of the walk-forward folds, run from Code/ with python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+
+from stockpred.backtest import walk_forward_folds
+
+
+def test_folds_cover_the_rows_after_initial():
+    folds = walk_forward_folds(100, 10, 60, 15)
+    assert [len(test_ends) for _, test_ends in folds] == [15, 15, 10]
+    assert np.array_equal(np.concatenate([test_ends for _, test_ends in folds]), np.arange(60, 100))
+
+
+def test_no_fold_is_an_error():
+    with pytest.raises(ValueError):
+        walk_forward_folds(100, 10, 100, 15)
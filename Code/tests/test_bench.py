@@ -0,0 +1,34 @@
+"""
+Tests of the benchmark suite, run from Code/ with python -m pytest tests
+"""
+
+import json
+
+import numpy as np
+
+from stockpred.bench import benchmark_pipeline, compare_benchmarks
+
+
+def test_pipeline_results_round_trip_through_compare(tmp_path):
+    paths = [str(tmp_path / 'base.json'), str(tmp_path / 'new.json')]
+    for path in paths:
+        results = benchmark_pipeline(sizes=(300,), repeat=1, output=path, stages=['process', 'convert', 'split'])
+    assert results['stage'].tolist() == ['process', 'convert', 'split']
+    assert (results['wall_s'] > 0).all() and (results['rows_per_s'] > 0).all()
+    with open(paths[0]) as file:
+        assert json.load(file)['meta']['repeat'] == 1
+    table = compare_benchmarks(*paths)
+    assert list(table.index) == [('process', 300), ('convert', 300), ('split', 300)]
+    np.testing.assert_allclose(table['ratio'], table['wall_s_new'] / table['wall_s_base'])
+
+
+def test_compare_flags_the_changes(tmp_path):
+    def write(name, times):
+        results = [{'stage': stage, 'size': 10, 'wall_s': wall_s, 'peak_mb': 1.0} for stage, wall_s in times.items()]
+        with open(tmp_path / name, 'w') as file:
+            json.dump({'meta': {}, 'results': results}, file)
+        return str(tmp_path / name)
+
+    table = compare_benchmarks(write('base.json', {'a': 1.0, 'b': 1.0, 'c': 1.0, 'gone': 1.0}),
+                               write('new.json', {'a': 1.5, 'b': 0.5, 'c': 1.05}), threshold=0.1)
+    assert table['flag'].to_dict() == {('a', 10): 'regression', ('b', 10): 'faster', ('c', 10): ''}
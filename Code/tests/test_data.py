@@ -0,0 +1,86 @@
+"""
+Tests of the price store and the window corpus, run from Code/ with python -m pytest tests
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from stockpred.bench import get_stationary_data_reference
+from stockpred.data import PriceStore, FeatureStore, GetDataset, WindowCorpus, get_stationary_data, hash_data, process
+
+
+class ChangingSource(object):
+    '''
+    Ten daily bars whose last close can be changed, like a bar fetched before the day closed
+    '''
+
+    def __init__(self):
+        self.close = 100.0
+
+    def fetch(self, scrip, start, end=None):
+        index = pd.date_range('2024-01-01', periods=10, freq='D', name='Date')
+        data = pd.DataFrame({col: np.arange(1.0, 11.0) for col in ['Open', 'High', 'Low', 'Close', 'Volume']},
+                            index=index)
+        data.loc[index[-1], 'Close'] = self.close
+        mask = data.index >= pd.Timestamp(start)
+        if end is not None:
+            mask &= data.index < pd.Timestamp(end)
+        return data[mask]
+
+
+def test_refresh_replaces_the_last_cached_bar(tmp_path):
+    source = ChangingSource()
+    assert PriceStore(str(tmp_path), source=source, max_age=0).load('X', '2024-01-01')['Close'].iloc[-1] == 100.0
+    source.close = 123.0
+    frame = PriceStore(str(tmp_path), source=source, max_age=0).load('X', '2024-01-01')
+    assert frame['Close'].iloc[-1] == 123.0
+    assert len(frame) == 10
+
+
+def test_hash_data_of_an_object_index():
+    frame = pd.DataFrame({'Close': [1.0, 2.0]}, index=pd.Index(['2024-01-01', '2024-01-02'], dtype=object))
+    assert hash_data(frame) == hash_data(frame.copy())
+    assert hash_data(frame) != hash_data(frame.set_axis(['2024-01-01', '2024-01-03']))
+
+
+def test_process_reuses_the_feature_store(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    data = np.linspace(1, 2, 50)
+    scaled, scaler = process(data, store=store)
+    cached, cached_scaler = process(data, store=store)
+    assert len(os.listdir(tmp_path)) == 1
+    np.testing.assert_array_equal(scaled, cached)
+    np.testing.assert_array_equal(scaler.scale_, cached_scaler.scale_)
+
+
+def test_stationary_data_matches_the_per_column_transform(bars):
+    expected = get_stationary_data_reference(bars.copy(), bars.columns, 12)
+    before = bars.copy()
+    pd.testing.assert_frame_equal(get_stationary_data(bars, bars.columns, 12), expected)
+    pd.testing.assert_frame_equal(bars, before)
+    single = get_stationary_data(bars, ['Close'], 12, dtype=np.float32)
+    assert single['Close'].dtype == np.float32
+    np.testing.assert_allclose(single['Close'], expected['Close'], rtol=1e-4, atol=1e-6)
+
+
+def test_corpus_series_round_trip(store, tmp_path):
+    scrips = ['A', 'BB', 'CCCC']
+    corpus = WindowCorpus.from_datasets(str(tmp_path / 'corpus'), scrips, '2015-10-01', store, scale=True)
+    assert corpus.y.shape[0] == corpus.x.shape[0]
+    for scrip in scrips:
+        dataset = GetDataset(store.load(scrip, '2015-10-01'), scrip)
+        dataset.get_dataset(scale=True)
+        x, y = corpus.series(scrip)
+        np.testing.assert_allclose(x, dataset.x_data.astype(np.float32))
+        np.testing.assert_allclose(y, dataset.y_data[:len(x)].astype(np.float32))
+
+
+def test_corpus_targets_invert_to_the_next_day_closes(store, tmp_path):
+    corpus = WindowCorpus.from_datasets(str(tmp_path / 'corpus'), ['A', 'BB'], '2015-10-01', store, scale=True)
+    for scrip in ['A', 'BB']:
+        _, rows = corpus.window_index(30, [scrip])
+        _, y = corpus.series(scrip)
+        closes = store.load(scrip, '2015-10-01')['Close'].to_numpy()
+        np.testing.assert_allclose(corpus.inverse_targets(scrip, y[rows], rows)[:, 0], closes[rows + 1], rtol=1e-5)
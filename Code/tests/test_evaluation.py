@@ -0,0 +1,43 @@
+"""
+Tests of the batched evaluation, run from Code/ with python -m pytest tests
+"""
+
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+from stockpred.evaluation import METRICS, compute_metrics, evaluate, inverse_scale, stack_series
+
+
+def loop_metrics(actual, predicted):
+    error = predicted - actual
+    moves = np.sign(predicted[1:] - actual[:-1]) == np.sign(actual[1:] - actual[:-1])
+    return [np.sum(error ** 2), np.mean(error ** 2), np.mean(np.abs(error)),
+            100 * np.mean(np.abs(error / actual)), np.mean(moves)]
+
+
+def test_metrics_of_series_of_different_lengths():
+    rng = np.random.default_rng(0)
+    actual = [100 + rng.normal(size=n) for n in (50, 80)]
+    predicted = [values + rng.normal(size=(2, len(values))) for values in actual]
+    table = evaluate(actual, predicted, ['A', 'B'], ['cnn', 'gru'])
+    assert table.metrics == list(METRICS)
+    for t, ticker in enumerate(['A', 'B']):
+        for m, model in enumerate(['cnn', 'gru']):
+            np.testing.assert_allclose([table.get(ticker, model, metric) for metric in METRICS],
+                                       loop_metrics(actual[t], predicted[t][m]))
+    assert table.to_frame().shape == (4, len(METRICS))
+
+
+def test_stack_series_aligns_the_last_values():
+    stacked = stack_series([np.array([1.0, 2.0]), np.array([3.0, 4.0, 5.0])])
+    np.testing.assert_array_equal(stacked, [[np.nan, 1, 2], [3, 4, 5]])
+    assert np.isnan(compute_metrics(np.full((1, 3), np.nan), np.zeros((1, 1, 3)))).all()
+
+
+def test_inverse_scale_matches_the_scalers():
+    rng = np.random.default_rng(1)
+    values = [rng.normal(size=(30, 1)) * (k + 1) + 10 * k for k in range(3)]
+    for kind in (MinMaxScaler, StandardScaler):   ## broadcast, then the fallback
+        scalers = [kind().fit(series) for series in values]
+        scaled = np.stack([scaler.transform(series)[:, 0] for scaler, series in zip(scalers, values)])
+        np.testing.assert_allclose(inverse_scale(scaled, scalers), np.stack([series[:, 0] for series in values]))
@@ -0,0 +1,48 @@
+"""
+Tests of the Keras forecasts, run from Code/ with python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+
+from stockpred.data import process, sliding_windows
+from stockpred.forecast import evaluate_models, forecast, forecast_rollout, prepared_scrips
+
+
+@pytest.fixture
+def cnn():
+    import tensorflow as tf
+    from stockpred.keras_models import cnnmodel
+    tf.keras.utils.set_random_seed(0)
+    return cnnmodel(20)
+
+
+def test_prepared_scrips_keep_their_order(store):
+    scrips = ['C', 'A', 'BB', 'D', 'EEE']
+    assert [stock for stock, *_ in prepared_scrips(scrips, 20, workers=3, prefetch=1, store=store)] == scrips
+
+
+def test_evaluate_models_scores_every_scrip_in_prices(cnn, store):
+    results = evaluate_models([cnn], ['cnn'], ['A', 'BB'], 20, store=store)
+    for scrip in ['A', 'BB']:
+        data, scaler = process(np.array(store.load(scrip)['Close']))
+        actual = scaler.inverse_transform(data[20:])
+        pred = scaler.inverse_transform(cnn.predict(sliding_windows(data, 20), verbose=0).astype(np.float64))
+        np.testing.assert_allclose(results.get(scrip, 'cnn', 'mse'), np.mean(np.square(pred - actual)), rtol=1e-4)
+
+
+def test_rollout_feeds_every_prediction_back(cnn):
+    window = np.random.default_rng(0).random((3, 20, 1)).astype(np.float32)
+    rollout = forecast_rollout(cnn, window, 4)
+    assert rollout.shape == (3, 4, 1)
+    for day in range(4):
+        pred = cnn(window).numpy()
+        np.testing.assert_allclose(rollout[:, day], pred, rtol=1e-5, atol=1e-6)
+        window = np.concatenate([window[:, 1:], pred[:, None]], axis=1)
+
+
+def test_forecast_of_many_scrips_at_once(cnn, store):
+    preds = forecast([cnn], ['cnn'], ['A', 'BB'], 20, days=5, store=store)
+    single = forecast([cnn], ['cnn'], ['BB'], 20, days=5, store=store)
+    assert preds['A']['cnn'].shape == (5, 1)
+    np.testing.assert_allclose(preds['BB']['cnn'], single['BB']['cnn'], rtol=1e-5)
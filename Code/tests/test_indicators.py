@@ -0,0 +1,67 @@
+"""
+Tests of the indicators against the loops they replaced, run from Code/ with python -m pytest tests
+"""
+
+import numpy as np
+
+import pytest
+
+from stockpred.bench import money_flow_index_reference, williams_r_reference, ulcer_index_reference, \
+    average_true_range_reference
+from stockpred.indicators import StreamingIndicators, average_true_range, money_flow_index, preprocess_data, \
+    rolling_sum, ulcer_index, williams_r
+
+
+@pytest.mark.parametrize('name, indicator, reference', [
+    ('williams_r', williams_r, williams_r_reference),
+    ('Ulcer_index', ulcer_index, ulcer_index_reference),
+    ('ATR', average_true_range, average_true_range_reference),
+])
+def test_rolling_indicators_equal_the_loops(bars, name, indicator, reference):
+    bars = bars.iloc[:500]
+    np.testing.assert_array_equal(indicator(bars.copy(), 14)[name], reference(bars.copy(), 14)[name])
+
+
+def test_money_flow_index_matches_the_loop(bars):
+    bars['Volume'] *= 1e4   ## high volume, the running sums drift the most
+    mfi = money_flow_index(bars.copy(), 14)['MFI'].to_numpy()
+    np.testing.assert_allclose(mfi, money_flow_index_reference(bars.copy(), 14)['MFI'].to_numpy(), rtol=0, atol=1e-9)
+
+
+def test_money_flow_index_without_flow_is_nan(bars):
+    bars['Volume'] = 0.0
+    mfi = money_flow_index(bars.copy(), 14)['MFI'].to_numpy()
+    assert np.all(mfi[:14] == 0) and np.all(np.isnan(mfi[14:]))
+    with np.errstate(invalid='ignore'):
+        np.testing.assert_array_equal(mfi, money_flow_index_reference(bars.copy(), 14)['MFI'].to_numpy())
+
+
+def test_rolling_sum_keeps_nans_in_their_windows():
+    values = np.arange(10, dtype=np.float64)
+    values[4] = np.nan
+    sums = rolling_sum(values, 3)
+    assert np.isnan(sums[2:5]).all()
+    np.testing.assert_array_equal(sums[[0, 1, 5, 6, 7]], [3, 6, 18, 21, 24])
+
+
+def streamed(bars, seed_rows):
+    indicators = StreamingIndicators()
+    rows = [indicators.seed(bars.iloc[:seed_rows])]
+    for bar in bars[['Open', 'High', 'Low', 'Close', 'Volume']].iloc[seed_rows:].itertuples(index=False):
+        rows.append(indicators.update(*bar))
+    return indicators.columns, np.array(rows)
+
+
+def test_streaming_indicators_match_the_batch_ones(bars):
+    columns, rows = streamed(bars, 1500)
+    batch = preprocess_data(bars[["Close", "Open", "High", "Low", "Volume"]].copy())
+    assert list(batch.columns) == columns
+    expected = batch.to_numpy()[1499:]
+    expected[-1, columns.index('RoC')] = rows[-1, columns.index('RoC')]   ## left empty by the batch version
+    np.testing.assert_allclose(rows, expected, rtol=1e-9, atol=1e-8)
+
+
+def test_streaming_money_flow_index_without_flow_is_nan(bars):
+    bars['Volume'] = 0.0
+    columns, rows = streamed(bars, 1500)
+    assert np.isnan(rows[:, columns.index('MFI')]).all()
@@ -0,0 +1,26 @@
+"""
+Tests of the package layout, run from Code/ with python -m pytest tests
+"""
+
+import os
+import subprocess
+import sys
+
+FRAMEWORKS = ('tensorflow', 'torch', 'matplotlib', 'sklearn', 'yfinance')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))   ## Code/
+
+
+def imported_frameworks(modules):
+    code = f"import sys, {', '.join(modules)}; print(' '.join(m for m in {FRAMEWORKS} if m in sys.modules))"
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                          cwd=ROOT).stdout.split()
+
+
+def test_the_modules_import_their_frameworks_lazily():
+    assert imported_frameworks(['stockpred.cli', 'stockpred.forecast', 'stockpred.serving', 'stockpred.backtest',
+                                'stockpred.sweep', 'stockpred.precision', 'stockpred.bench']) == []
+
+
+def test_the_cli_lists_its_subcommands():
+    result = subprocess.run([sys.executable, '-m', 'stockpred', '--help'], capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0 and 'keras' in result.stdout
@@ -0,0 +1,59 @@
+"""
+Tests of the reduced-precision variants, run from Code/ with python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+import torch
+
+from stockpred.precision import TFLiteModel, convert_tflite, precision_report, transformer_variant
+from stockpred.transformer import TransformerModel
+
+
+@pytest.fixture
+def transformer(small_params):
+    torch.manual_seed(0)
+    return TransformerModel(small_params).eval()
+
+
+@pytest.fixture
+def windows(small_params):
+    return np.random.default_rng(0).normal(size=(16, 10, small_params.model_dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize('precision, atol', [('float32', 0), ('bfloat16', 5e-2), ('int8', 5e-2)])
+def test_transformer_variants_stay_close(transformer, windows, precision, atol):
+    with torch.inference_mode():
+        expected = transformer(torch.from_numpy(windows)).numpy()
+        variant = transformer_variant(transformer, precision)
+        predicted = variant(torch.from_numpy(windows)).numpy()
+    assert predicted.dtype == np.float32
+    np.testing.assert_allclose(predicted, expected, atol=atol)
+    if precision == 'int8':   ## quantizes a copy
+        assert variant is not transformer
+        assert transformer.transf.encoder.blocks()[0][0].layer.qkv.weight.dtype == torch.float32
+
+
+def test_unknown_precisions_raise(transformer):
+    with pytest.raises(ValueError):
+        transformer_variant(transformer, 'float16')
+    with pytest.raises(ValueError):
+        convert_tflite(None, 'bfloat16')
+
+
+def test_precision_report(transformer, windows):
+    report = precision_report({'transformer': transformer}, windows, np.zeros(len(windows)),
+                              batch_sizes=(1, 4), repeat=1)
+    assert list(report.index) == [('transformer', precision) for precision in ('float32', 'bfloat16', 'int8')]
+    assert report.loc[('transformer', 'float32'), 'max_abs_diff'] == 0
+    assert {'mse', 'size_mb', 'latency_ms_1', 'latency_ms_4'} <= set(report.columns)
+
+
+def test_tflite_float32_matches_keras():
+    import tensorflow as tf
+    from stockpred.keras_models import lstmmodel
+    tf.keras.utils.set_random_seed(0)
+    model = lstmmodel(16)   ## converted unrolled
+    windows = np.random.default_rng(0).normal(size=(8, 16, 1)).astype(np.float32)
+    tflite = TFLiteModel(convert_tflite(model, 'float32'))
+    np.testing.assert_allclose(tflite.predict(windows), model.predict_on_batch(windows), atol=1e-5)
@@ -0,0 +1,31 @@
+"""
+Tests of the pipeline profiler, run from Code/ with python -m pytest tests
+"""
+
+import tracemalloc
+
+from stockpred import profiling
+
+
+def test_spans_are_recorded_while_enabled():
+    @profiling.profiled(rows='input')
+    def stage(values):
+        return sum(values)
+
+    with profiling.profile() as profiler:
+        stage([1, 2, 3])
+    stage([4])
+    assert [(span.name, span.rows) for span in profiler.spans] == [(stage.__qualname__, 3)]
+
+
+def test_disable_keeps_the_callers_tracemalloc():
+    tracemalloc.start()
+    try:
+        with profiling.profile(trace_memory=True):
+            pass
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    with profiling.profile(trace_memory=True):
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,39 @@
+"""
+Tests of the micro-batching of the forecast server, run from Code/ with python -m pytest tests
+"""
+
+import threading
+
+import pytest
+
+from stockpred.serving import MicroBatcher
+
+
+def test_an_error_only_fails_its_request():
+    def handler(requests):
+        return [ValueError(f'bad {request}') if request < 0 else request * 2 for request in requests]
+
+    batcher = MicroBatcher(handler, max_batch=4, max_wait=0.5)
+    results = dict()
+
+    def submit(request):
+        try:
+            results[request] = batcher.submit(request)
+        except ValueError as error:
+            results[request] = str(error)
+
+    threads = [threading.Thread(target=submit, args=(request,)) for request in (1, -1, 2, 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {1: 2, -1: 'bad -1', 2: 4, 3: 6}
+    assert list(batcher.batch_sizes) == [4]
+
+
+def test_a_failing_handler_fails_the_batch():
+    def handler(requests):
+        raise RuntimeError('down')
+
+    with pytest.raises(RuntimeError):
+        MicroBatcher(handler, max_wait=0).submit(1)
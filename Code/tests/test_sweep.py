@@ -0,0 +1,29 @@
+"""
+Tests of the successive halving sweep, run from Code/ with python -m pytest tests
+"""
+
+import numpy as np
+
+from stockpred.sweep import sweep, read_log, trial_id
+
+
+def test_trial_id_ignores_the_order_of_the_parameters():
+    assert trial_id({'steps': 50, 'model': 'cnn'}) == trial_id({'model': 'cnn', 'steps': 50})
+    assert trial_id({'steps': 50}) != trial_id({'steps': 100})
+
+
+def test_a_failing_trial_ranks_last_and_the_sweep_resumes(tmp_path):
+    rng = np.random.default_rng(0)
+    x_data, y_data = rng.normal(size=(120, 16)), rng.normal(size=(120, 1))
+    space = {'time_period': [10], 'n_layers': [1], 'forward_dim': [8, -1]}   ## no Linear of -1 features
+    kwargs = dict(path=str(tmp_path), kind='transformer', min_epochs=1, max_epochs=2, eta=2, workers=1)
+
+    results = sweep(space, x_data, y_data, **kwargs)
+    log = read_log(str(tmp_path))
+    assert results['forward_dim'].tolist() == [8, -1]
+    assert np.isnan(results['val_loss'].iloc[1]) and not np.isnan(results['val_loss'].iloc[0])
+    assert [entry['params']['forward_dim'] for entry in log if 'error' in entry] == [-1]
+
+    resumed = sweep(space, x_data, y_data, **kwargs)
+    assert len(read_log(str(tmp_path))) == len(log)   ## nothing is trained again
+    assert resumed['val_loss'].iloc[0] == results['val_loss'].iloc[0]
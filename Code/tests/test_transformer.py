@@ -0,0 +1,118 @@
+"""
+Tests of the transformer layers and its training, run from Code/ with python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+import torch
+
+from stockpred.bench import _saved_bytes
+from stockpred.data import GetDataset
+from stockpred.transformer import TransformerModel, Classifier, CompiledTransformer, WindowDataset, \
+    BalancedBatchSampler, MultiHeadAttention, PositionalEncoding, positioning_encoding, scaled_dot_product_attention
+
+
+def test_window_dataset_matches_split(store):
+    dataset = GetDataset(store.load('A', '2015-10-01'), 'A')
+    dataset.get_dataset(scale=True)
+    (x_train, y_train), _, _ = dataset.split(0.8, 30)
+    windows = dataset.get_window_dataset(0.8, 30)
+    x, y = windows[np.arange(len(windows))]   ## gathered as one batch
+    np.testing.assert_array_equal(x.numpy(), x_train.astype(np.float32))
+    np.testing.assert_array_equal(y.numpy(), y_train.astype(np.float32))
+    np.testing.assert_array_equal(windows[5][0].numpy(), x_train[5].astype(np.float32))
+
+
+def test_train_batches_lowers_the_loss(small_params):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(400, small_params.model_dim))
+    y = np.roll(x[:, :1], 1, axis=0)   ## the target of a window is its last row's first feature
+    torch.manual_seed(0)
+    clf = Classifier(TransformerModel(small_params))
+    params = type('params', (small_params,), {'n_epochs': 3, 'lr': 0.001})
+    hist = clf.train_batches(WindowDataset(x, y, 10), params)
+    assert len(hist) == 3 and hist[-1] < hist[0]
+    assert len(clf.epoch_stats) == 3
+
+
+
+def test_balanced_batches_draw_every_ticker_evenly():
+    groups = np.repeat([7, 3, 5], [1000, 50, 10])   ## histories of very different lengths
+    sampler = BalancedBatchSampler(groups, batch_size=32, n_batches=20, seed=0)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 20
+    for batch in batches:
+        counts = np.unique(groups[batch], return_counts=True)[1]
+        assert len(counts) == 3 and counts.max() - counts.min() <= 1
+
+def test_fused_attention_matches_attention_head_by_head():
+    torch.manual_seed(0)
+    attention = MultiHeadAttention(3, 8, 4, 5).eval()
+    x = torch.randn(2, 7, 8)
+    q, k, v = attention.qkv(x).split([12, 12, 15], dim=-1)
+    heads = [scaled_dot_product_attention(q[..., 4 * h:4 * h + 4], k[..., 4 * h:4 * h + 4], v[..., 5 * h:5 * h + 5])
+             for h in range(3)]
+    with torch.no_grad():
+        torch.testing.assert_close(attention(x, x, x), attention.linear(torch.cat(heads, dim=-1)))
+        torch.testing.assert_close(attention(x, x.clone(), x.clone()), attention(x, x, x))   ## unfused path
+
+
+def test_shared_head_checkpoints_load_into_the_fused_layout(small_params):
+    torch.manual_seed(0)
+    shared = TransformerModel(type('params', (small_params,), {'shared_heads': True})).eval()
+    fused = TransformerModel(small_params).eval()
+    fused.load_state_dict(shared.state_dict())
+    x = torch.randn(2, 10, small_params.model_dim)
+    with torch.no_grad():
+        torch.testing.assert_close(fused(x), shared(x))
+
+
+def test_positional_encodings_are_cached_prefixes():
+    encoding = PositionalEncoding(16, max_length=8)
+    short = encoding(5, torch.float32, torch.device('cpu'))
+    assert encoding(5, torch.float32, torch.device('cpu')) is short
+    torch.testing.assert_close(short, positioning_encoding(5, 16))
+    torch.testing.assert_close(encoding(20, torch.float64, torch.device('cpu')), positioning_encoding(20, 16).double())
+
+
+def test_forward_leaves_its_input_untouched(small_params):
+    model = TransformerModel(small_params).eval()
+    x = torch.randn(2, 10, small_params.model_dim)
+    before = x.clone()
+    with torch.no_grad():
+        first, second = model(x), model(x)
+    torch.testing.assert_close(x, before)
+    torch.testing.assert_close(first, second)
+
+
+def test_checkpoint_only_keeps_the_layer_inputs(small_params):
+    x = torch.randn(4, 20, small_params.model_dim)
+    torch.manual_seed(0)
+    model = TransformerModel(type('params', (small_params,), {'shared_layers': False})).train()
+    torch.manual_seed(0)
+    checkpointed = TransformerModel(type('params', (small_params,), {'shared_layers': False, 'checkpoint': True})).train()
+    out, saved = _saved_bytes(lambda: model(x), list(model.parameters()))
+    checkpointed_out, checkpointed_saved = _saved_bytes(lambda: checkpointed(x), list(checkpointed.parameters()))
+    torch.testing.assert_close(out, checkpointed_out)
+    assert checkpointed_saved < saved
+    assert checkpointed_saved >= 3 * x.numel() * x.element_size()   ## the input of every layer
+
+
+def test_compiled_transformer_matches_the_model_and_reloads(small_params, tmp_path):
+    torch.manual_seed(0)
+    clf = Classifier(TransformerModel(small_params))
+    windows = np.random.default_rng(0).normal(size=(40, 10, small_params.model_dim)).astype(np.float32)
+    with torch.no_grad():
+        expected = clf.model.eval()(torch.from_numpy(windows)).numpy()
+    compiled = clf.compile(10, batch_sizes=(1, 16))   ## predicted in chunks of 16
+    np.testing.assert_allclose(compiled.predict(windows), expected, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(clf.predict((windows[::2].astype(np.float64), None), None, data_scaled=False),
+                               expected[::2], rtol=1e-5, atol=1e-6)   ## copied through the input buffer
+
+    compiled.save(str(tmp_path / 'model.pt'))
+    loaded = CompiledTransformer.load(str(tmp_path / 'model.pt'), batch_sizes=(1, 16))
+    out = np.zeros((40, 1), dtype=np.float32)
+    assert loaded.predict(windows, out) is out
+    np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-6)
+    with pytest.raises(ValueError):
+        loaded.predict(windows[:, :5])